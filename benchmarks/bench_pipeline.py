@@ -0,0 +1,313 @@
+'''
+Benchmarks the data pipeline stages of autotrain_vision on synthetic YOLO datasets.
+
+Every stage runs in its own process so its peak RSS is measured in isolation. Results are written as JSON and,
+given a baseline from an earlier run, any stage that got slower, heavier or wrote more than the tolerance allows
+fails the run with exit code 1.
+
+    python benchmarks/bench_pipeline.py --images 200 --size 640x480 --boxes 3 --out bench.json
+    python benchmarks/bench_pipeline.py --baseline bench.json
+'''
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import resource
+import multiprocessing
+
+import cv2
+import numpy as np
+
+STAGES = ("prev_data_copy", "drawing_bb", "label_parse", "augment", "split_and_yaml", "annotate")
+CLASS_NAMES = ["cat", "dog", "mug", "phone"]
+
+
+def make_dataset(folder, images, size, boxes, seed=0):
+    '''
+    Writes a synthetic YOLO dataset: noisy JPEG images with filled rectangles and one label row per rectangle
+
+    Args:
+        - folder (str): Folder to create the images and labels folders and data.yaml in
+        - images (int): Number of images
+        - size (tuple): Image width and height
+        - boxes (int): Boxes per image
+        - seed (int): Seed for the generated content
+    '''
+    rng = np.random.default_rng(seed)
+    width, height = size
+    os.makedirs(os.path.join(folder, "images"), exist_ok=True)
+    os.makedirs(os.path.join(folder, "labels"), exist_ok=True)
+    for i in range(images):
+        image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        wh = rng.uniform(0.05, 0.4, (boxes, 2))
+        centers = rng.uniform(wh/2, 1-wh/2)
+        cls = rng.integers(0, len(CLASS_NAMES), boxes)
+        for (xc, yc), (w, h) in zip(centers, wh):
+            top_left = (int((xc-w/2)*width), int((yc-h/2)*height))
+            bottom_right = (int((xc+w/2)*width), int((yc+h/2)*height))
+            cv2.rectangle(image, top_left, bottom_right, tuple(int(v) for v in rng.integers(0, 256, 3)), -1)
+        cv2.imwrite(os.path.join(folder, "images", f"img_{i:06d}.jpg"), image)
+        with open(os.path.join(folder, "labels", f"img_{i:06d}.txt"), "w") as file:
+            file.writelines(f"{c} {x:.6f} {y:.6f} {w:.6f} {h:.6f}\n" for c, (x, y), (w, h) in zip(cls, centers, wh))
+    with open(os.path.join(folder, "data.yaml"), "w") as file:
+        file.write("names:\n" + "".join(f"- {name}\n" for name in CLASS_NAMES))
+
+
+def inodes(folder):
+    '''
+    Returns {(device, inode): size} for every regular file under folder
+    '''
+    found = {}
+    for root, _, files in os.walk(folder):
+        for name in files:
+            st = os.lstat(os.path.join(root, name))
+            if not os.path.islink(os.path.join(root, name)):
+                found[(st.st_dev, st.st_ino)] = st.st_size
+    return found
+
+
+def peak_rss_mb():
+    '''
+    Returns the peak RSS of this process and of its reaped children, in MB
+    '''
+    scale = 1 if sys.platform == "darwin" else 1024
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak*scale/(1 << 20)
+
+
+def stage_run_folder(workdir, dataset):
+    '''
+    Creates a run folder whose raw_dataset is a hardlinked copy of the synthetic dataset, and its RunState
+    '''
+    from autotrain_vision.run_state import RunState
+    from autotrain_vision.dataset_stage import DatasetStage
+    run_folder = tempfile.mkdtemp(prefix="run_", dir=workdir)
+    DatasetStage(logging.getLogger("benchmark"), dataset, os.path.join(run_folder, "raw_dataset")).stage()
+    run_state = RunState(os.path.join(run_folder, "inputs.json"))
+    run_state.set_labels(CLASS_NAMES)
+    return run_folder, run_state
+
+
+class StubProcessor:
+    '''
+    Stands in for the Grounding DINO processor: resizes like the real image processor and returns one box per frame
+    '''
+    def __init__(self, torch):
+        self.torch = torch
+        self.image_processor = self.preprocess
+
+    def tokenizer(self, text, return_tensors="pt"):
+        ids = self.torch.arange(len(text.split())+2).unsqueeze(0)
+        return {"input_ids": ids, "attention_mask": self.torch.ones_like(ids), "token_type_ids": self.torch.zeros_like(ids)}
+
+    def preprocess(self, images, return_tensors="pt"):
+        frames = [cv2.resize(np.asarray(image), (800, 800)) for image in images]
+        pixel_values = self.torch.from_numpy(np.stack(frames).astype(np.float32)/255.0).permute(0, 3, 1, 2)
+        return {"pixel_values": pixel_values, "pixel_mask": self.torch.ones(pixel_values.shape[0], 800, 800, dtype=self.torch.long)}
+
+    def post_process_grounded_object_detection(self, outputs, input_ids, box_threshold, text_threshold, target_sizes):
+        results = []
+        for logits, (height, width) in zip(outputs, target_sizes):
+            box = self.torch.tensor([[0.25*width, 0.25*height, 0.75*width, 0.75*height]])
+            results.append({"boxes": box, "scores": logits.sigmoid().reshape(1), "labels": ["object"]})
+        return results
+
+
+def stub_model(torch):
+    '''
+    Stands in for the Grounding DINO model with a pooled mean per frame, so only the pipeline around the model is measured
+    '''
+    def forward(pixel_values, pixel_mask, **text_inputs):
+        return pixel_values.mean(dim=(1, 2, 3))
+    return forward
+
+
+def run_prev_data_copy(workdir, dataset, config):
+    from autotrain_vision.roboflow_bb import RoboflowBB
+    from autotrain_vision.run_state import RunState
+    run_folder = tempfile.mkdtemp(prefix="run_", dir=workdir)
+    rfbb = RoboflowBB(logging.getLogger("benchmark"), dataset, run_folder, RunState(os.path.join(run_folder, "inputs.json")), os.path.join(dataset, "data.yaml"), workers=config["workers"])
+    return rfbb.make_copy_folder, config["images"]
+
+
+def run_drawing_bb(workdir, dataset, config):
+    from autotrain_vision.roboflow_bb import RoboflowBB
+    run_folder, run_state = stage_run_folder(workdir, dataset)
+    rfbb = RoboflowBB(logging.getLogger("benchmark"), dataset, run_folder, run_state, os.path.join(dataset, "data.yaml"), workers=config["workers"])
+    return rfbb.drawing_bb, config["images"]
+
+
+def run_label_parse(workdir, dataset, config):
+    from autotrain_vision.label_store import LabelStore
+    store = LabelStore(logging.getLogger("benchmark"), os.path.join(dataset, "labels"), cache_file=os.path.join(workdir, "labels_cache.npz"))
+    return store.load, config["images"]
+
+
+def run_augment(workdir, dataset, config):
+    # the augmentation workers import albumentations; check here so a missing install skips the stage
+    import albumentations  # noqa: F401
+    from autotrain_vision import AutoTrain
+    # AutoTrain writes logger.log into the working directory
+    os.chdir(workdir)
+    at = AutoTrain(workdir, number_aug=config["number_aug"], aug_workers=config["workers"], aug_seed=0)
+    at.logger.setLevel(logging.WARNING)
+    run_folder, at.run_state = stage_run_folder(workdir, dataset)
+    at.combined_folder = run_folder
+    return at.augment, config["images"]*config["number_aug"]
+
+
+def run_split_and_yaml(workdir, dataset, config):
+    from autotrain_vision.new_data import NewData
+    from autotrain_vision.dataset_stage import DatasetStage
+    run_folder, run_state = stage_run_folder(workdir, dataset)
+    DatasetStage(logging.getLogger("benchmark"), dataset, os.path.join(run_folder, "aug_dataset")).stage()
+    zsl = NewData(logging.getLogger("benchmark"), run_folder, run_state, "object.", config["images"], 1, 0.5, False, 0.4)
+    return zsl.split_and_yaml, config["images"]
+
+
+def run_annotate(workdir, dataset, config):
+    import torch
+    from autotrain_vision.new_data import NewData
+    from autotrain_vision.annotator import GroundingDinoAnnotator
+    from autotrain_vision.model_registry import MODEL_REGISTRY
+    run_folder, run_state = stage_run_folder(workdir, dataset)
+    annotator = GroundingDinoAnnotator(logging.getLogger("benchmark"), device="cpu")
+    MODEL_REGISTRY.get(annotator.processor_key, lambda: StubProcessor(torch))
+    MODEL_REGISTRY.get(annotator.model_key, lambda: stub_model(torch))
+    zsl = NewData(logging.getLogger("benchmark"), run_folder, run_state, "object.", config["images"], 1, 0.5, False, 0.4, annotator=annotator)
+    images = sorted(os.listdir(os.path.join(dataset, "images")))
+    frames = [cv2.cvtColor(cv2.imread(os.path.join(dataset, "images", name)), cv2.COLOR_BGR2RGB) for name in images]
+
+    def annotate():
+        for frame in frames:
+            zsl.owl_pred_live(frame)
+    return annotate, len(frames)
+
+
+def run_stage(stage, workdir, dataset, config, queue):
+    '''
+    Runs one stage in the current (child) process and puts its measurements on queue
+    '''
+    logging.basicConfig(level=logging.INFO if config["verbose"] else logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.getLogger("benchmark").setLevel(logging.INFO if config["verbose"] else logging.WARNING)
+    try:
+        # run_<stage> does the untimed setup and returns the timed call
+        call, items = globals()[f"run_{stage}"](workdir, dataset, config)
+        before = {**inodes(dataset), **inodes(workdir)}
+        start = time.perf_counter()
+        call()
+        seconds = time.perf_counter()-start
+        written = sum(size for key, size in inodes(workdir).items() if key not in before)
+        queue.put({"seconds": round(seconds, 4), "items": items, "items_per_sec": round(items/seconds, 2) if seconds > 0 else None, "peak_rss_mb": round(peak_rss_mb(), 1), "bytes_written": written})
+    except ImportError as e:
+        queue.put({"skipped": f"missing dependency: {e.name}"})
+
+
+def run_benchmarks(config):
+    '''
+    Generates the synthetic dataset and runs every selected stage in a fresh process
+
+    Args:
+        - config (dict): Benchmark settings, see main
+    Returns:
+        - dict: Config, environment and per-stage results
+    '''
+    root = tempfile.mkdtemp(prefix="autotrain_bench_")
+    try:
+        dataset = os.path.join(root, "dataset")
+        start = time.perf_counter()
+        make_dataset(dataset, config["images"], config["size"], config["boxes"])
+        print(f"Generated {config['images']} images in {time.perf_counter()-start:.1f}s")
+        context = multiprocessing.get_context("spawn")
+        stages = {}
+        for stage in config["stages"]:
+            workdir = os.path.join(root, stage)
+            os.makedirs(workdir)
+            queue = context.Queue()
+            process = context.Process(target=run_stage, args=(stage, workdir, dataset, config, queue))
+            process.start()
+            process.join()
+            stages[stage] = queue.get() if not queue.empty() else {"failed": f"exit code {process.exitcode}"}
+            print(f"{stage:16s} {stages[stage]}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return {
+        "config": {key: list(value) if isinstance(value, tuple) else value for key, value in config.items() if key != "verbose"},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "stages": stages,
+    }
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Compares results against a baseline from an earlier run
+
+    Args:
+        - results (dict): Output of run_benchmarks
+        - baseline (dict): Output of an earlier run_benchmarks
+        - tolerance (float): Allowed relative change, e.g. 0.2 for 20%
+    Returns:
+        - list: One message per regression
+    '''
+    regressions = []
+    for key in ("images", "size", "boxes", "number_aug", "workers"):
+        if baseline["config"].get(key) != results["config"].get(key):
+            regressions.append(f"config {key} is {results['config'].get(key)} but the baseline used {baseline['config'].get(key)}; results are not comparable")
+    if regressions:
+        return regressions
+    for stage, current in results["stages"].items():
+        previous = baseline["stages"].get(stage)
+        if previous is None or "seconds" not in previous:
+            continue
+        if "seconds" not in current:
+            regressions.append(f"{stage}: ran in the baseline but now {current}")
+            continue
+        if current["items_per_sec"] < previous["items_per_sec"]*(1-tolerance):
+            regressions.append(f"{stage}: throughput {current['items_per_sec']}/s vs baseline {previous['items_per_sec']}/s")
+        if current["peak_rss_mb"] > previous["peak_rss_mb"]*(1+tolerance):
+            regressions.append(f"{stage}: peak RSS {current['peak_rss_mb']} MB vs baseline {previous['peak_rss_mb']} MB")
+        if current["bytes_written"] > previous["bytes_written"]*(1+tolerance):
+            regressions.append(f"{stage}: wrote {current['bytes_written']} bytes vs baseline {previous['bytes_written']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the autotrain_vision data pipeline on a synthetic dataset")
+    parser.add_argument("--images", type=int, default=200, help="number of synthetic images")
+    parser.add_argument("--size", default="640x480", help="image resolution as WIDTHxHEIGHT")
+    parser.add_argument("--boxes", type=int, default=3, help="boxes per image")
+    parser.add_argument("--number-aug", type=int, default=3, help="augmented copies per image")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="workers for staging, drawing and augmentation")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--out", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression against the baseline")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own logs")
+    args = parser.parse_args(argv)
+
+    width, height = (int(value) for value in args.size.lower().split("x"))
+    config = {"images": args.images, "size": (width, height), "boxes": args.boxes, "number_aug": args.number_aug, "workers": args.workers, "stages": args.stages, "verbose": args.verbose}
+    results = run_benchmarks(config)
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Wrote {args.out}")
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if regressions:
+            print("REGRESSIONS against " + args.baseline + ":")
+            for message in regressions:
+                print("  " + message)
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from .model_registry import MODEL_REGISTRY
+from .tracing import Tracer
+
+
+class Annotator:
+    '''
+    Base class of the zero-shot annotators NewData uses to label captured frames.
+    Subclasses implement _annotate; annotate wraps it and records the per-frame latency.
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+    '''
+    name = "base"
+
+    def __init__(self, logger):
+        self.logger = logger
+        # bounded, so latency tracking stays cheap on long captures
+        self.tracer = Tracer(max_samples=2048)
+
+    def annotate(self, color_frames, prompt, box_threshold=0.6, text_threshold=0.4, tags=None):
+        '''
+        Annotates a batch of images
+
+        Args:
+            - color_frames (list): RGB images (numpy.ndarray) to annotate
+            - prompt (str): Text prompt, e.g. the generic object name
+            - box_threshold (float): Minimum box score
+            - text_threshold (float): Minimum text score
+            - tags (list): Source tag per frame; only used by annotators that carry state from frame to frame, see KeyframeAnnotator
+        Returns:
+            - list: One dict per frame with "boxes" (numpy.ndarray of xmin, ymin, xmax, ymax rows), "scores" (numpy.ndarray) and "labels" (list)
+        '''
+        start = time.perf_counter()
+        results = self._annotate(color_frames, prompt, box_threshold, text_threshold)
+        self.tracer.observe("annotation_ms", (time.perf_counter()-start)*1e3/max(1, len(color_frames)))
+        return results
+
+    def _annotate(self, color_frames, prompt, box_threshold, text_threshold):
+        raise NotImplementedError
+
+    def latency(self):
+        '''
+        Returns:
+            - dict: Per-frame annotation latency in ms (count, mean, p50, p95, max)
+        '''
+        return self.tracer.summary()["histograms"].get("annotation_ms", {})
+
+    def report(self):
+        '''
+        Returns:
+            - dict: Annotation stats logged after capture; the per-frame latency for annotators that look at every frame
+        '''
+        return {"latency_ms": self.latency()}
+
+
+class GroundingDinoAnnotator(Annotator):
+    '''
+    Grounding DINO through transformers, on GPU when one is available.
+    The processor and model are loaded on first use and shared through the model registry.
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - model_name (str): Hugging Face model id
+        - device (str or torch.device): Device to run on; picked on first use if None
+    '''
+    name = "grounding_dino"
+
+    def __init__(self, logger, model_name="IDEA-Research/grounding-dino-tiny", device=None):
+        super().__init__(logger)
+        self.model_name = model_name
+        self._device = device
+        # tokenized prompt per batch size and reusable device buffers, see _annotate
+        self._prompt_name = None
+        self._prompt_batches = {}
+        self._buffers = {}
+
+    @property
+    def device(self):
+        '''
+        Device used for annotation, picked on first use
+        '''
+        import torch
+        if self._device is None:
+            self._device = torch.device(0 if torch.cuda.is_available() else ("mps" if torch.backends.mps.is_available() else "cpu"))
+        elif not isinstance(self._device, torch.device):
+            self._device = torch.device(self._device)
+        return self._device
+
+    @property
+    def processor_key(self):
+        return f"processor:{self.model_name}"
+
+    @property
+    def model_key(self):
+        return f"annotator:{self.model_name}:{self.device}"
+
+    @property
+    def processor(self):
+        '''
+        Grounding DINO processor, loaded on first use and shared through the model registry
+        '''
+        def load():
+            from transformers import AutoProcessor
+            return AutoProcessor.from_pretrained(self.model_name)
+        return MODEL_REGISTRY.get(self.processor_key, load)
+
+    def load_model(self):
+        '''
+        Loads the model onto self.device; called once per model_key
+        '''
+        from transformers import AutoModelForZeroShotObjectDetection
+        return AutoModelForZeroShotObjectDetection.from_pretrained(self.model_name).to(self.device).eval()
+
+    @property
+    def model(self):
+        '''
+        Grounding DINO model on self.device, loaded on first use and shared through the model registry
+        '''
+        return MODEL_REGISTRY.get(self.model_key, self.load_model)
+
+    def encode_prompt(self, prompt, batch_size=1):
+        '''
+        Tokenizes the prompt once per session and returns it repeated for a batch, cached on the device
+
+        Args:
+            - prompt (str): Text prompt
+            - batch_size (int): Number of frames in the batch
+        Returns:
+            - dict: input_ids, attention_mask and token_type_ids tensors with batch_size rows
+        '''
+        if self._prompt_name != prompt:
+            self._prompt_name = prompt
+            self._prompt_batches = {}
+        if batch_size not in self._prompt_batches:
+            text_inputs = self.processor.tokenizer(prompt, return_tensors="pt")
+            self._prompt_batches[batch_size] = {key: value.repeat(batch_size, 1).to(self.device) for key, value in text_inputs.items()}
+        return self._prompt_batches[batch_size]
+
+    def _reuse_buffer(self, name, tensor):
+        '''
+        Moves a preprocessed tensor to self.device. On CUDA it goes through a pinned host buffer into a device buffer, both kept across calls and reallocated only when the shape changes,
+        so the upload is asynchronous; elsewhere the processor's new tensor is used as is, without an extra copy
+        '''
+        if self.device.type != "cuda":
+            return tensor.to(self.device)
+        import torch
+        host, buffer = self._buffers.get(name, (None, None))
+        if buffer is None or buffer.shape != tensor.shape or buffer.dtype != tensor.dtype:
+            host = torch.empty(tensor.shape, dtype=tensor.dtype, pin_memory=True)
+            buffer = torch.empty(tensor.shape, dtype=tensor.dtype, device=self.device)
+            self._buffers[name] = (host, buffer)
+        # the previous upload from host finished before its results were copied back in _forward, so host is free again
+        host.copy_(tensor)
+        buffer.copy_(host, non_blocking=True)
+        return buffer
+
+    def _forward(self, color_frames, target_sizes, prompt, box_threshold, text_threshold):
+        '''
+        Runs one forward pass and returns boxes scaled to target_sizes
+        '''
+        import torch
+        images = [Image.fromarray(color_frame) for color_frame in color_frames]
+        text_inputs = self.encode_prompt(prompt, len(images))
+        pixel_inputs = self.processor.image_processor(images=images, return_tensors="pt")
+        pixel_values = self._reuse_buffer("pixel_values", pixel_inputs["pixel_values"])
+        pixel_mask = self._reuse_buffer("pixel_mask", pixel_inputs["pixel_mask"])
+
+        # mixed precision only where it exists; on CPU autocast would only add overhead
+        with torch.inference_mode(), torch.autocast(device_type="cuda", enabled=self.device.type == "cuda"):
+            outputs = self.model(pixel_values=pixel_values, pixel_mask=pixel_mask, **text_inputs)
+        results = self.processor.post_process_grounded_object_detection(outputs, text_inputs["input_ids"], box_threshold=box_threshold, text_threshold=text_threshold, target_sizes=target_sizes)
+        return [{"boxes": result["boxes"].float().cpu().numpy(), "scores": result["scores"].float().cpu().numpy(), "labels": result["labels"]} for result in results]
+
+    def _annotate(self, color_frames, prompt, box_threshold, text_threshold):
+        return self._forward(color_frames, [color_frame.shape[:2] for color_frame in color_frames], prompt, box_threshold, text_threshold)
+
+
+class CpuGroundingDinoAnnotator(GroundingDinoAnnotator):
+    '''
+    Grounding DINO tuned for machines without a GPU: dynamically quantized INT8 linear layers, a fixed number of intra-op threads,
+    inference mode, and optional downscaling of the input with the boxes mapped back to the full frame.
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - model_name (str): Hugging Face model id
+        - threads (int): Intra-op threads for torch; its default if None
+        - quantize (boolean): True to quantize the linear layers to INT8
+        - max_side (int): Frames with a longer side are downscaled to it before annotation; None keeps the full resolution
+    '''
+    name = "grounding_dino_cpu"
+
+    def __init__(self, logger, model_name="IDEA-Research/grounding-dino-tiny", threads=None, quantize=True, max_side=None):
+        super().__init__(logger, model_name=model_name, device="cpu")
+        self.quantize = quantize
+        self.max_side = max_side
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+            self.logger.info(f"Annotating with {threads} torch threads")
+
+    @property
+    def model_key(self):
+        return f"annotator:{self.model_name}:cpu{':int8' if self.quantize else ''}"
+
+    def load_model(self):
+        model = super().load_model()
+        if self.quantize:
+            import torch
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    def _annotate(self, color_frames, prompt, box_threshold, text_threshold):
+        target_sizes = [color_frame.shape[:2] for color_frame in color_frames]
+        if self.max_side:
+            scaled = []
+            for color_frame in color_frames:
+                height, width = color_frame.shape[:2]
+                scale = self.max_side/max(height, width)
+                if scale < 1:
+                    color_frame = cv2.resize(color_frame, (int(round(width*scale)), int(round(height*scale))), interpolation=cv2.INTER_AREA)
+                scaled.append(color_frame)
+            color_frames = scaled
+        # boxes come back normalized and are scaled to the original frame sizes
+        return self._forward(color_frames, target_sizes, prompt, box_threshold, text_threshold)
+
+
+class FakeAnnotator(Annotator):
+    '''
+    Annotator without a model, for tests and benchmarks: every frame gets the same box
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - box (tuple): xmin, ymin, xmax, ymax relative to the frame size
+        - score (float): Score of the box
+        - delay (float): Seconds to sleep per batch, to simulate a model
+    '''
+    name = "fake"
+
+    def __init__(self, logger, box=(0.25, 0.25, 0.75, 0.75), score=0.9, delay=0.0):
+        super().__init__(logger)
+        self.box = np.array(box, dtype=np.float32)
+        self.score = score
+        self.delay = delay
+
+    def _annotate(self, color_frames, prompt, box_threshold, text_threshold):
+        if self.delay:
+            time.sleep(self.delay)
+        results = []
+        for color_frame in color_frames:
+            height, width = color_frame.shape[:2]
+            keep = self.score >= box_threshold
+            boxes = (self.box*np.array([width, height, width, height], dtype=np.float32))[None] if keep else np.zeros((0, 4), dtype=np.float32)
+            results.append({"boxes": boxes, "scores": np.full(len(boxes), self.score, dtype=np.float32), "labels": [prompt]*len(boxes)})
+        return results
+
+
+ANNOTATORS = {annotator.name: annotator for annotator in (GroundingDinoAnnotator, CpuGroundingDinoAnnotator, FakeAnnotator)}
+
+
+def make_annotator(logger, name="grounding_dino", **options):
+    '''
+    Builds an annotator by name
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - name (str): One of ANNOTATORS: "grounding_dino", "grounding_dino_cpu" or "fake"
+        - options: Keyword arguments of the annotator class
+    Returns:
+        - Annotator: The annotator
+    '''
+    if name not in ANNOTATORS:
+        raise ValueError(f"Unknown annotator {name}, expected one of {sorted(ANNOTATORS)}")
+    return ANNOTATORS[name](logger, **options)
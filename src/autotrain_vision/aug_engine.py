@@ -0,0 +1,142 @@
+import os
+import time
+import zlib
+import random
+import logging
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from .utils_aug import Augment
+from .label_store import LabelStore
+from .shard_store import ShardReader, ShardWriter
+from .tracing import NULL_TRACER
+
+# Augment instance owned by the current worker process, built once by _init_worker
+_worker_aug = None
+
+
+def _init_worker(combined_folder, run_state, shards=False):
+    '''
+    Process pool initializer; builds the Augment instance and its pipeline once per worker
+
+    Args:
+        - combined_folder (str): Path to local folder to store the new data
+        - run_state (RunState): Shared in-memory state of the run's inputs.json
+        - shards (boolean): True to read raw_dataset/shards and append to aug_dataset/shards, one shard writer per worker process
+    '''
+    global _worker_aug
+    _worker_aug = Augment(logger=logging.getLogger("AutoTrain"), combined_folder=combined_folder, run_state=run_state)
+    _worker_aug.transform = _worker_aug.build_transform()
+    if shards:
+        _worker_aug.shard_reader = ShardReader(combined_folder+"/raw_dataset/shards")
+        _worker_aug.shard_writer = ShardWriter(_worker_aug.logger, combined_folder+"/aug_dataset/shards", prefix=f"aug-{os.getpid()}")
+        return
+    # AugmentEngine.run builds the cache first, so this only loads the .npz file
+    _worker_aug.label_store = LabelStore(_worker_aug.logger, combined_folder+"/raw_dataset/labels").load()
+
+
+def _augment_image(img_file, number_aug, seed):
+    '''
+    Augments one image number_aug times and stores the results in aug_dataset
+
+    Args:
+        - img_file (str): Name of the image file in raw_dataset/images
+        - number_aug (int): Number of times to apply augmentations
+        - seed (int): Seed for this image, so results do not depend on which worker runs it
+    Returns:
+        - tuple: Number of augmented images written, and seconds taken
+    '''
+    start = time.perf_counter()
+    aug = _worker_aug
+    image, gt_bboxes, aug_file_name = aug.get_inp_data(img_file)
+    aug.seed(seed)
+    for n in range(number_aug):
+        aug_img, aug_label = aug.get_augmented_results(image, gt_bboxes)
+        aug.store_aug(aug_img, aug_label, f"{aug_file_name}_{n+1}")
+    return number_aug, time.perf_counter()-start
+
+
+class AugmentEngine:
+    '''
+    Runs the augmentation of raw_dataset into aug_dataset, optionally across a process pool.
+    Every image is seeded from its file name and the base seed, so the output is the same for any number of workers.
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - combined_folder (str): Path to local folder to store the new data
+        - run_state (RunState): Shared in-memory state of the run's inputs.json
+        - number_aug (int): Number of times to apply augmentations
+        - workers (int): Number of worker processes; 1 runs in the current process, 0 or None uses every CPU
+        - max_in_flight (int): Maximum number of images submitted but not finished; defaults to 4 per worker
+        - seed (int): Base seed; a random one is picked and logged if None
+        - tracer (Tracer): Records per-image augmentation time and throughput; tracing is off if None
+        - shards (boolean): True to read the images from raw_dataset/shards and write the results to aug_dataset/shards instead of image and label files
+    '''
+    def __init__(self, logger, combined_folder, run_state, number_aug, workers=1, max_in_flight=None, seed=None, tracer=None, shards=False):
+        self.logger = logger
+        self.combined_folder = combined_folder
+        self.run_state = run_state
+        self.number_aug = number_aug
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_in_flight = max_in_flight or 4*self.workers
+        self.seed = seed if seed is not None else random.randrange(2**31)
+        self.tracer = tracer or NULL_TRACER
+        self.shards = shards
+
+    def image_seed(self, img_file):
+        '''
+        Returns the seed for a given image file name
+        '''
+        return zlib.crc32(img_file.encode()) ^ self.seed
+
+    def _collect(self, result):
+        '''
+        Records one _augment_image result and returns the number of images it wrote
+        '''
+        written, seconds = result
+        self.tracer.count("augment.images")
+        self.tracer.observe("augment.image_ms", seconds*1e3)
+        return written
+
+    def run(self, imgs):
+        '''
+        Augments the given images and stores the results in aug_dataset
+
+        Args:
+            - imgs (list): Image file names in raw_dataset/images, or in raw_dataset/shards with shards
+        Returns:
+            - dict: Number of images processed, augmented images written, seconds taken and images/sec
+        '''
+        start = time.perf_counter()
+        written = 0
+        if not self.shards:
+            # parse every label file once, before the workers load the cached index
+            LabelStore(self.logger, self.combined_folder+"/raw_dataset/labels").load()
+        if self.workers == 1:
+            _init_worker(self.combined_folder, self.run_state, self.shards)
+            try:
+                for img_file in imgs:
+                    written += self._collect(_augment_image(img_file, self.number_aug, self.image_seed(img_file)))
+            finally:
+                if _worker_aug.shard_writer is not None:
+                    _worker_aug.shard_writer.close()
+                    _worker_aug.shard_reader.close()
+        else:
+            # worker shard writers flush every record, so nothing is lost when the pool shuts the workers down
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.combined_folder, self.run_state, self.shards)) as pool:
+                pending = set()
+                for img_file in imgs:
+                    if len(pending) >= self.max_in_flight:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        written += sum(self._collect(future.result()) for future in done)
+                    pending.add(pool.submit(_augment_image, img_file, self.number_aug, self.image_seed(img_file)))
+                written += sum(self._collect(future.result()) for future in wait(pending)[0])
+        seconds = time.perf_counter() - start
+        stats = {
+            "images": len(imgs),
+            "written": written,
+            "seconds": round(seconds, 3),
+            "images_per_sec": round(len(imgs)/seconds, 2) if seconds > 0 else 0.0,
+        }
+        self.tracer.observe("augment.images_per_sec", stats["images_per_sec"])
+        self.logger.info(f"Augmented {stats['images']} images into {stats['written']} with {self.workers} worker(s), seed {self.seed}: {stats['images_per_sec']} images/sec")
+        return stats
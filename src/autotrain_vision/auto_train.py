@@ -1,5 +1,5 @@
-import json
 import os
+import time
 import shutil
 import logging
 from logging.handlers import RotatingFileHandler
@@ -8,7 +8,37 @@ from datetime import datetime
 from .roboflow_bb import RoboflowBB
 from .new_data import NewData
 from .utils_aug import Augment
+from .aug_engine import AugmentEngine
+from .dataset_stage import folder_bytes
+from .shard_store import ShardReader, pack_folder, export_folder, remove_shards
 from .available_cam import AvailableCam
+from .run_state import RunState
+from .frame_gate import FrameGate
+from .frame_source import MultiSource
+from .tracing import Tracer
+from .annotator import make_annotator
+from .keyframe_tracker import KeyframeAnnotator
+
+
+def configure_logger(logger):
+    '''
+    Sets up console and rotating file (logger.log) output on a logger
+
+    Args:
+        - logger (logging.Logger): Logger to configure, e.g. logging.getLogger("AutoTrain")
+    '''
+    logger.propagate = False
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    # Define a StreamHandler to log messages to the console
+    handler = logging.StreamHandler()
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+    file_handler = RotatingFileHandler('logger.log', mode='a', maxBytes=10 * 1024 * 1024, backupCount=3)  # 10 MB max size, 3 backups
+    file_handler.setLevel(logging.INFO)
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
 
 
 class AutoTrain:
@@ -28,36 +58,57 @@ class AutoTrain:
         - inference (boolean): True to perform the inference on live feed
         - inference_threshold (float): value<=1 ; Threshold for inference confidence score
         - camera_range (int): Range of camera indexes to look for
+        - aug_workers (int): Number of processes for augmentation; 0 uses every CPU
+        - aug_seed (int): Base seed for augmentation; results are the same for any aug_workers
+        - online_augment (boolean): True to augment inside the training data loader with new variants every epoch instead of writing number_aug copies to aug_dataset
+        - capture_pipeline (boolean): True to capture on a separate thread and write images in the background while annotating
+        - annotation_batch (int): Number of frames annotated together by Grounding DINO
+        - annotation_nms_iou (float): IoU above which overlapping annotator boxes of a frame are merged, whatever their label; None keeps every box. Every remaining box is written to the frame's label file
+        - source (int or str or list): Camera index, video file or image directory to capture from instead of selecting a camera; a list of several is captured concurrently
+        - multi_camera (boolean): True to select several cameras and capture from all of them at once
+        - source_quotas (dict): {source tag: images} to take from each source when capturing from several, e.g. {"cam0": 60, "cam2": 40}
+        - source_weights (dict): {source tag: weight} to split image_threshold across sources proportionally; equal split if None
+        - headless (boolean): True to capture and run live inference without display windows
+        - frame_gate (boolean): True to skip frames nearly identical to already accepted ones before annotating
+        - gate_diff_threshold (float): Mean pixel difference (0-255) to the last accepted frame below which a frame is skipped
+        - gate_hash_distance (int): Perceptual hash distance (0-64) to a recently accepted frame at or below which a frame is skipped
+        - split_mode (str): "list" for train.txt/val.txt image lists, "symlink" for symlink folders, "copy" to copy the split with splitfolders
+        - split_seed (int): Seed for the train/val split
+        - blob_cache (boolean): True to import prev_data_folder through a content-addressed store in data_folder/.blobs shared by all runs
+        - shard_storage (boolean): True to keep captured and augmented images in append-only shard files (raw_dataset/shards, aug_dataset/shards) instead of one file per image and label; they are exported to aug_dataset/images and labels for training
+        - warm_start (str): Path to a previous best.pt to start training from instead of yolov8n.pt
+        - patience (int): Epochs without mAP improvement before training stops; None keeps the ultralytics default
+        - export_onnx (boolean): True to export the trained weights to ONNX and run live inference through ONNX Runtime on CPU
+        - onnx_int8 (boolean): True to export a dynamically quantized INT8 ONNX model instead
+        - annotator (str): Annotator backend: "grounding_dino" (GPU when available), "grounding_dino_cpu" (quantized, thread-tuned CPU) or "fake" (fixed box, for tests)
+        - annotator_options (dict): Keyword arguments of the annotator, e.g. {"threads": 8, "max_side": 640} for "grounding_dino_cpu"
+        - keyframe_interval (int): Run the annotator only every this many frames and track its boxes with optical flow in between (see KeyframeAnnotator); None annotates every frame
+        - tracker_options (dict): Keyword arguments of KeyframeAnnotator, e.g. {"min_confidence": 0.5, "drift_iou": 0.5}
+        - trace (boolean): True to time every stage and hot loop and write trace_summary.json and trace.json (Chrome trace) into the run folder
+        - run_folder (str): Name of the run folder in data_folder; a new timestamped one if None
+        - resume (boolean): True to reopen run_folder if it exists, with its inputs.json and capture checkpoint, instead of raising; capture continues where it stopped
+        - loader_workers (int): Training data loader worker processes, in either augmentation mode; the ultralytics default if None
+        - blob_folder (str): Folder whose .blobs store blob_cache uses, e.g. a parent folder shared by several data_folders; data_folder if None
     '''
-    def __init__(self, data_folder, prev_data_folder="", new_weights=True, abs_yaml_file=None, draw_bb=False, image_threshold=100, number_aug=3, epochs=69, map_threshold=0.5, inference=False, inference_threshold=0.4, camera_range=10) -> None:
+    def __init__(self, data_folder, prev_data_folder="", new_weights=True, abs_yaml_file=None, draw_bb=False, image_threshold=100, number_aug=3, epochs=69, map_threshold=0.5, inference=False, inference_threshold=0.4, camera_range=10, aug_workers=1, aug_seed=None, online_augment=False, capture_pipeline=False, annotation_batch=1, annotation_nms_iou=None, source=None, multi_camera=False, source_quotas=None, source_weights=None, headless=False, frame_gate=False, gate_diff_threshold=2.0, gate_hash_distance=4, split_mode="list", split_seed=0, blob_cache=False, shard_storage=False, warm_start=None, patience=None, export_onnx=False, onnx_int8=False, annotator="grounding_dino", annotator_options=None, keyframe_interval=None, tracker_options=None, trace=False, run_folder=None, resume=False, loader_workers=None, blob_folder=None) -> None:
 
         self.logger = logging.getLogger(self.__class__.__name__)
-        self.logger.propagate = False
-        # Clear existing handlers to avoid duplicate logs
-        if self.logger.hasHandlers():
-            self.logger.handlers.clear()
-
-        # Define a StreamHandler to log messages to the console
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        handler = logging.StreamHandler()
-        
-        handler.setFormatter(formatter)
-        self.logger.addHandler(handler)
-        self.logger.setLevel(logging.INFO)
-
-        file_handler = RotatingFileHandler('logger.log', mode='a', maxBytes=10 * 1024 * 1024, backupCount=3)  # 10 MB max size, 3 backups
-        file_handler.setLevel(logging.INFO)
-        file_handler.setFormatter(formatter)
-        self.logger.addHandler(file_handler)
-
+        # configured once per process; a job runner may already be logging through it from another thread
+        if not self.logger.handlers:
+            configure_logger(self.logger)
 
         self.timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
 
         self.data_folder = data_folder
-        self.combined_folder = os.path.join(self.data_folder, f"train_v{self.timestamp}" if not new_weights else f"new_weights_v{self.timestamp}")
+        if resume and run_folder is None:
+            raise ValueError("resume needs the run_folder to reopen")
+        self.combined_folder = os.path.join(self.data_folder, run_folder or (f"train_v{self.timestamp}" if not new_weights else f"new_weights_v{self.timestamp}"))
+        # reopening an interrupted run instead of starting a new one
+        self.resuming = resume and os.path.exists(self.combined_folder)
         self.prev_data_folder = prev_data_folder
         self.new_weights = new_weights
         self.json_file = f"{self.combined_folder}/inputs.json"
+        self.run_state = RunState(self.json_file)
         self.draw_bb = draw_bb
         self.abs_yaml_file = abs_yaml_file
         if not self.new_weights and self.abs_yaml_file==None:
@@ -70,12 +121,47 @@ class AutoTrain:
         self.inference = inference
         self.inference_threshold = inference_threshold
         self.camera_range = camera_range
+        self.aug_workers = aug_workers
+        self.loader_workers = loader_workers
+        self.aug_seed = aug_seed
+        self.online_augment = online_augment
+        # augmentation time and training data size on disk, so online and offline runs can be compared
+        self.dataset_report = {}
+        self.capture_pipeline = capture_pipeline
+        self.annotation_batch = annotation_batch
+        self.annotation_nms_iou = annotation_nms_iou
+        self.source = source
+        self.multi_camera = multi_camera
+        self.source_quotas = source_quotas
+        self.source_weights = source_weights
+        self.headless = headless
+        self.frame_gate = frame_gate
+        self.gate_diff_threshold = gate_diff_threshold
+        self.gate_hash_distance = gate_hash_distance
+        self.split_mode = split_mode
+        self.split_seed = split_seed
+        self.blob_cache = blob_cache
+        self.blob_folder = blob_folder or data_folder
+        self.shard_storage = shard_storage
+        self.warm_start = warm_start
+        self.patience = patience
+        self.export_onnx = export_onnx
+        self.onnx_int8 = onnx_int8
+        self.annotator = make_annotator(self.logger, annotator, **(annotator_options or {}))
+        if keyframe_interval:
+            self.annotator = KeyframeAnnotator(self.logger, self.annotator, interval=keyframe_interval, **(tracker_options or {}))
+        self.tracer = Tracer(enabled=trace)
 
     def prev_data(self):
         '''
         Function returns and stores previous data in YOLOv8 format in raw_dataset.
         '''
-        rfbb = RoboflowBB(logger=self.logger, prev_folder=self.prev_data_folder, combined_folder=self.combined_folder, json_file=self.json_file, abs_yaml_file=self.abs_yaml_file)
+        blob_store = None
+        if self.blob_cache:
+            # imported here so `python -m autotrain_vision.blob_store` does not import itself twice
+            from .blob_store import BlobStore
+            blob_store = BlobStore(logger=self.logger, data_folder=self.blob_folder)
+        rfbb = RoboflowBB(logger=self.logger, prev_folder=self.prev_data_folder, combined_folder=self.combined_folder, run_state=self.run_state, abs_yaml_file=self.abs_yaml_file, blob_store=blob_store)
         if self.draw_bb:
             # copies and draws bb in a combined dataset; updates json file as per the yaml file
             rfbb.run()
@@ -90,82 +176,204 @@ class AutoTrain:
         '''
         Function augments the images and labels to store the combined dataset for training in aug_dataset.
         '''
-        aug = Augment(logger=self.logger, combined_folder=self.combined_folder, json_file=self.json_file)
+        aug = Augment(logger=self.logger, combined_folder=self.combined_folder, run_state=self.run_state)
+        if self.shard_storage:
+            return self.augment_shards(aug)
         imgs = [img for img in os.listdir(self.combined_folder+"/raw_dataset/images") if aug.is_image_by_extension(img)]
+        # stage raw_dataset into aug_dataset once; the engine only writes new files
+        aug.make_copy_folder(os.path.join(self.combined_folder, 'aug_dataset'))
+        engine = AugmentEngine(logger=self.logger, combined_folder=self.combined_folder, run_state=self.run_state, number_aug=self.number_aug, workers=self.aug_workers, seed=self.aug_seed, tracer=self.tracer)
+        with self.tracer.span("augment", images=len(imgs)):
+            engine.run(imgs)
+        self.logger.info("Augmented and saved dataset")
+
+    def pack_raw_shards(self):
+        '''
+        Packs previous data imported as files into raw_dataset into the raw shards, which capture writes to with shard_storage
+
+        Returns:
+            - str: The raw shard folder
+        '''
+        raw_shards = self.combined_folder+"/raw_dataset/shards"
+        pack_folder(self.logger, self.combined_folder+"/raw_dataset", raw_shards, prefix="prev")
+        return raw_shards
 
-        for img_file in imgs:
-            image, gt_bboxes, aug_file_name = aug.get_inp_data(img_file)
-            for n in range(self.number_aug):
-                aug_img, aug_label = aug.get_augmented_results(image, gt_bboxes)
-                aug.store_aug(aug_img, aug_label, f"{aug_file_name}_{n+1}")
+    def augment_shards(self, aug):
+        '''
+        Augments raw_dataset/shards into aug_dataset/shards and exports both to aug_dataset as image and label files for training.
+        Previous data imported as files into raw_dataset is packed into the raw shards first.
+        '''
+        raw_shards = self.pack_raw_shards()
+        aug_shards = self.combined_folder+"/aug_dataset/shards"
+        reader = ShardReader(raw_shards)
+        imgs = [img for img in reader.names if aug.is_image_by_extension(img)]
+        reader.close()
+        # augmented shards are rebuilt from scratch, since each worker appends under its own prefix
+        remove_shards(aug_shards)
+        engine = AugmentEngine(logger=self.logger, combined_folder=self.combined_folder, run_state=self.run_state, number_aug=self.number_aug, workers=self.aug_workers, seed=self.aug_seed, tracer=self.tracer, shards=True)
+        with self.tracer.span("augment", images=len(imgs)):
+            engine.run(imgs)
+            export_folder(self.logger, [raw_shards, aug_shards], os.path.join(self.combined_folder, 'aug_dataset'))
         self.logger.info("Augmented and saved dataset")
 
-    def new_data(self, object_name, object_specific):
+    def setup(self):
         '''
-        Generates new data for the input object, splits it and creates a YAML file for training
-        Trains data to generate new weights file
+        Creates the run folder and inputs.json, selects the camera unless a source is given, and imports previous data
+        '''
+        if self.resuming:
+            self.logger.info(f"Resuming the run in {self.combined_folder}")
+            # previous data was imported when the run started; only a missing camera choice is asked for again
+            if self.source is None and self.run_state.camera_index is None:
+                with self.tracer.span("camera_selection"):
+                    cam = AvailableCam(logger=self.logger, run_state=self.run_state, camera_range=self.camera_range)
+                    if self.multi_camera:
+                        cam.select_cameras()
+                    else:
+                        cam.select_camera()
+            return
+        # check if raw_dataset folder exists or not
+        if not os.path.exists(self.combined_folder):
+            os.makedirs(self.combined_folder+"/raw_dataset/images")
+            os.makedirs(self.combined_folder+"/raw_dataset/labels")
+        else:
+            raise IOError(f"{self.combined_folder} already exists. Input new name for folder.")
+        # create the json file
+        self.run_state.save()
+        #get camera index, unless capturing from a given source
+        if self.source is None:
+            with self.tracer.span("camera_selection"):
+                cam = AvailableCam(logger=self.logger, run_state=self.run_state, camera_range=self.camera_range)
+                if self.multi_camera:
+                    cam.select_cameras()
+                else:
+                    cam.select_camera()
+
+        # get previous data
+        if not self.new_weights:
+            with self.tracer.span("prev_data"):
+                self.prev_data()
+
+    def add_object_label(self, object_name, object_specific):
+        '''
+        Adds the object's generic name as the last label, unless a resumed run already has it (or its final name) there
+        '''
+        labels = self.run_state.candidate_labels
+        if self.resuming and labels and labels[-1] in (object_name, object_specific):
+            return
+        self.run_state.add_label(object_name)
+
+    def live_source(self):
+        '''
+        Picks what live inference runs on after training: the given camera or video file, the first camera of a list of sources, or the selected camera
+
+        Returns:
+            - int or str: Camera index or video file; None if the run captured from image directories only
+        '''
+        source = self.source
+        if source is None:
+            return self.run_state.camera_index
+        sources = source if isinstance(source, (list, tuple)) else [source]
+        for source in sources:
+            if isinstance(source, int) or (isinstance(source, str) and source.isdigit()):
+                return int(source)
+        # a single video file is replayed; a list without cameras has nothing live to run on
+        if len(sources) == 1 and isinstance(sources[0], str) and os.path.isfile(sources[0]):
+            return sources[0]
+        return None
+
+    def prepare_data(self, object_name, object_specific):
+        '''
+        Generates new data for the input object, augments and splits it and creates a YAML file for training
 
         Args:
-            - object (str): Object to be detected
+            - object_name (str): Generic name of the object to detect, already added as the last label
+            - object_specific (str): Name to give the trained object
         Returns:
-            - new_weights_path (str): Path to the new '.pt' weights file
+            - NewData: Annotator and trainer for the prepared dataset, see train_model
         '''
-        zsl = NewData(logger=self.logger, combined_folder=self.combined_folder, json_file=self.json_file, object_name=object_name, image_threshold=self.image_threshold, epochs=self.epochs, map_threshold=self.map_threshold, inference=self.inference, inference_threshold=self.inference_threshold)
+        zsl = NewData(logger=self.logger, combined_folder=self.combined_folder, run_state=self.run_state, object_name=object_name, image_threshold=self.image_threshold, epochs=self.epochs, map_threshold=self.map_threshold, inference=self.inference, inference_threshold=self.inference_threshold, tracer=self.tracer, annotator=self.annotator, live_source=self.live_source(), show=not self.headless)
+        source = self.source
+        if source is None and self.multi_camera:
+            source = list(self.run_state.camera_indices)
+        if isinstance(source, (list, tuple)):
+            source = MultiSource(source, quotas=self.source_quotas, weights=self.source_weights)
+        gate = FrameGate(diff_threshold=self.gate_diff_threshold, hash_distance=self.gate_hash_distance) if self.frame_gate else None
         # Capture, split and store dataset; create yaml file
-        zsl.capture_pred(box_threshold=0.6, text_threshold=0.4)
+        with self.tracer.span("capture"):
+            zsl.capture_pred(box_threshold=0.6, text_threshold=0.4, pipeline=self.capture_pipeline, batch_size=self.annotation_batch, nms_iou=self.annotation_nms_iou, source=source, headless=self.headless, gate=gate, shards=self.shard_storage)
         self.logger.info("Done capturing frames \n")
         # update the json file with new class
-        with open(self.json_file, 'r') as file:
-            data = json.load(file)
-        data['candidate_labels'].pop()
-        data['candidate_labels'].append(object_specific)
-        with open(self.json_file, 'w') as file:
-            json.dump(data, file, indent=4)
-        # Augment dataset
-        self.augment()
+        self.run_state.replace_last_label(object_specific)
+        # Augment dataset, unless the training data loader does it
+        start = time.perf_counter()
+        if not self.online_augment:
+            self.augment()
+            dataset = "aug_dataset"
+        elif self.shard_storage:
+            # ultralytics reads files, so the raw shards are exported unaugmented
+            export_folder(self.logger, self.pack_raw_shards(), os.path.join(self.combined_folder, 'aug_dataset'))
+            dataset = "aug_dataset"
+        else:
+            dataset = "raw_dataset"
+        augment_seconds = time.perf_counter()-start
         # Update yaml file
-        zsl.split_and_yaml()
+        with self.tracer.span("split"):
+            zsl.split_and_yaml(mode=self.split_mode, seed=self.split_seed, dataset=dataset)
+        self.dataset_report = {"augment": "online" if self.online_augment else "offline", "augment_seconds": round(augment_seconds, 3), "disk_bytes": folder_bytes([os.path.join(self.combined_folder, folder) for folder in ("raw_dataset", "aug_dataset", "split_dataset")])}
+        self.logger.info(f"Training data: {self.dataset_report}")
+        return zsl
+
+    def train_model(self, zsl):
+        '''
+        Trains on a dataset made by prepare_data
+
+        Args:
+            - zsl (NewData): Result of prepare_data
+        Returns:
+            - tuple: Path to the new '.pt' weights file (None if mAP50 stayed below map_threshold) and the mAP50 score
+        '''
         # Train on new yaml file and get the MaP50 scores
-        new_weights_path, _ = zsl.train()
+        with self.tracer.span("train"):
+            result = zsl.train(warm_start=self.warm_start, patience=self.patience, export_onnx=self.export_onnx, onnx_int8=self.onnx_int8, online_augment=self.online_augment, aug_seed=self.aug_seed, workers=self.loader_workers)
+        zsl.train_report.update(self.dataset_report)
+        return result
+
+    def new_data(self, object_name, object_specific):
+        '''
+        Generates new data for the input object, splits it and creates a YAML file for training
+        Trains data to generate new weights file
+
+        Args:
+            - object (str): Object to be detected
+        Returns:
+            - new_weights_path (str): Path to the new '.pt' weights file
+        '''
+        zsl = self.prepare_data(object_name, object_specific)
+        new_weights_path, _ = self.train_model(zsl)
         return new_weights_path
     
-    def run(self):
+    def run(self, object_name=None, object_specific=None):
         '''
         Complete process to get available cameras, and use that to run autotrain and get new weights file.
+
+        Args:
+            - object_name (str): Generic name of the object to detect; asked for on the console if None
+            - object_specific (str): Name to give the trained object; asked for on the console if None
         '''
+        created = False
         try:
-            # check if raw_dataset folder exists or not
-            if not os.path.exists(self.combined_folder):
-                os.makedirs(self.combined_folder+"/raw_dataset/images")
-                os.makedirs(self.combined_folder+"/raw_dataset/labels")
-            else:
-                raise IOError(f"{self.combined_folder} already exists. Input new name for folder.")
-            # check for existence of json file
-            if not os.path.exists(self.json_file):
-                with open(self.json_file, "w") as f:
-                    json_data = {
-                        "candidate_labels": []
-                    }
-                    json.dump(json_data, f, indent=4)
-            #get camera index
-            cam = AvailableCam(logger=self.logger, json_file=self.json_file, camera_range=self.camera_range)
-            cam.select_camera()
-
-            # get previous data
-            if not self.new_weights:
-                self.prev_data()
+            if not os.path.exists(self.combined_folder) or self.resuming:
+                created = True
+            self.setup()
 
             # give generic name of object to detect
-            object_name = input("What object you want to detect: \n") + "."
-            # update the json file with new class
-            with open(self.json_file, 'r') as file:
-                data = json.load(file)
-            data['candidate_labels'].append(object_name)
-            with open(self.json_file, 'w') as file:
-                json.dump(data, file, indent=4)
-            
+            if object_name is None:
+                object_name = input("What object you want to detect: \n") + "."
             # Create new data for object specified; and train it and get the MaP50 score
-            object_specific = input("What name do you want to give to your trained object: \n")
+            if object_specific is None:
+                object_specific = input("What name do you want to give to your trained object: \n")
+            # update the json file with new class
+            self.add_object_label(object_name, object_specific)
             new_weights_path = self.new_data(object_name=object_name, object_specific=object_specific)
             return new_weights_path
 
@@ -177,8 +385,18 @@ class AutoTrain:
                     shutil.rmtree(self.combined_folder)
         except KeyboardInterrupt:
             self.logger.error("Process interrupted in between")
-            if os.listdir(f"{self.combined_folder}/raw_dataset"):
+            # a run with a capture checkpoint is kept, so it can be resumed with run_folder and resume=True
+            if os.path.exists(f"{self.combined_folder}/capture_checkpoint.json"):
+                self.logger.error(f"Kept {self.combined_folder}; resume it with run_folder={os.path.basename(self.combined_folder)!r} and resume=True")
+            elif os.listdir(f"{self.combined_folder}/raw_dataset"):
                 shutil.rmtree(self.combined_folder)
+        finally:
+            # only into a folder this run created, and only if it was not removed above
+            if created and os.path.isdir(self.combined_folder):
+                paths = self.tracer.export(self.combined_folder)
+                if paths:
+                    self.logger.info(f"Trace written to {paths[0]} and {paths[1]}")
+                    self.logger.info(f"Time per span (ms): { {name: span['total_ms'] for name, span in self.tracer.summary()['spans'].items()} }")
 
 
 if __name__ == "__main__":
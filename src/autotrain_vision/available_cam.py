@@ -1,5 +1,35 @@
+import os
+import sys
+import glob
+import time
+import threading
+
 import cv2
-import json
+
+
+# cameras found per (camera_range, capture_backend), shared by every AvailableCam in the process
+_CAMERA_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def candidate_indices(camera_range):
+    '''
+    Returns the camera indices worth probing. On Linux only indices with a /dev/video* node are returned, so absent devices are never opened.
+
+    Args:
+        - camera_range (int): Range of camera indices to check
+    Returns:
+        - list: Sorted camera indices
+    '''
+    if sys.platform.startswith("linux") and os.path.isdir("/dev"):
+        indices = set()
+        for node in glob.glob("/dev/video*"):
+            suffix = node[len("/dev/video"):]
+            if suffix.isdigit() and int(suffix) < camera_range:
+                indices.add(int(suffix))
+        return sorted(indices)
+    return list(range(camera_range))
+
 
 class AvailableCam():
     '''
@@ -7,57 +37,140 @@ class AvailableCam():
 
     Args:
         - logger (object instance): Logger instance for adding logs
-        - json_file (str): Path to inputs.json file used for training new data
+        - run_state (RunState): Shared in-memory state of the run's inputs.json
         - camera_range (int): Range of camera indices to check
+        - probe_timeout (float): Seconds to wait for all cameras to be probed; slower indices are skipped
+        - cache_ttl (float): Seconds a discovered device list is reused before probing again
+        - capture_backend (callable): Opens a camera index and returns a cv2.VideoCapture-like object; defaults to cv2.VideoCapture
     '''
-    def __init__(self, logger, json_file, camera_range):
+    def __init__(self, logger, run_state, camera_range, probe_timeout=3.0, cache_ttl=30.0, capture_backend=None):
         self.logger = logger
         self.camera_range = camera_range
-        self.json_file = json_file
+        self.run_state = run_state
+        self.probe_timeout = probe_timeout
+        self.cache_ttl = cache_ttl
+        self.capture_backend = capture_backend or cv2.VideoCapture
+
+    def probe(self, index):
+        '''
+        Opens a camera index and reads the resolution and FPS it reports
+
+        Args:
+            - index (int): Camera index
+        Returns:
+            - dict: {"index", "width", "height", "fps"}, or None if the camera cannot be opened
+        '''
+        cap = self.capture_backend(index)
+        try:
+            if not cap.isOpened():
+                return None
+            return {
+                "index": index,
+                "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                "fps": float(cap.get(cv2.CAP_PROP_FPS)),
+            }
+        finally:
+            cap.release()
+
+    def get_camera_info(self, refresh=False):
+        '''
+        Probes the candidate camera indices concurrently, reusing a recent result from the cache
+
+        Args:
+            - refresh (boolean): True to ignore the cache and probe again
+        Returns:
+            - list: One {"index", "width", "height", "fps"} dict per available camera, sorted by index
+        '''
+        key = (self.camera_range, self.capture_backend)
+        with _CACHE_LOCK:
+            cached = _CAMERA_CACHE.get(key)
+        if cached is not None and not refresh and time.monotonic() - cached[0] < self.cache_ttl:
+            return cached[1]
+
+        results = {}
+        def run_probe(index):
+            try:
+                results[index] = self.probe(index)
+            except Exception as e:
+                self.logger.warning(f"Probing camera {index} failed: {e}")
+                results[index] = None
+        # daemon threads, so a probe stuck inside the backend never blocks the process from exiting
+        indices = candidate_indices(self.camera_range)
+        threads = [threading.Thread(target=run_probe, args=(index,), daemon=True) for index in indices]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + self.probe_timeout
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        timed_out = [index for index, thread in zip(indices, threads) if thread.is_alive()]
+        if timed_out:
+            self.logger.warning(f"Camera probes timed out for indices {timed_out}")
+
+        cameras = sorted((info for info in list(results.values()) if info is not None), key=lambda info: info["index"])
+        with _CACHE_LOCK:
+            _CAMERA_CACHE[key] = (time.monotonic(), cameras)
+        return cameras
 
     def get_available_cameras(self):
         '''
-        Function retirns the list of available camera indeices within the specified range
+        Function returns the list of available camera indices within the specified range
         '''
-        available_cameras = []
-        # Check for cameras 
-        for i in range(self.camera_range):
-            cap = cv2.VideoCapture(i)
-            if cap.isOpened():
-                available_cameras.append(i)
-                cap.release()
-        return available_cameras
+        return [info["index"] for info in self.get_camera_info()]
 
     def select_camera(self):
         '''
         Function inputs the camera index to use and stores that in the json file
         '''
-        cameras = self.get_available_cameras()
+        camera_info = self.get_camera_info()
+        cameras = [info["index"] for info in camera_info]
         #check for present cameras
         if cameras:
             #for multiple cameras
             if len(cameras)>1:
-                self.logger.info("Available Cameras:", cameras)
+                self.logger.info("Available Cameras:")
+                for info in camera_info:
+                    self.logger.info(f"  {info['index']}: {info['width']}x{info['height']} @ {info['fps']:.0f} FPS")
                 while True:
                     cam_index = input('Enter camera index to use: ')
                     if int(cam_index) in cameras:
-                        #store the cam index as dict in input.json
-                        with open(self.json_file, 'r') as file:
-                            data = json.load(file)
-                        data['camera_index'] = cam_index
-                        with open(self.json_file, 'w') as file:
-                            json.dump(data, file, indent=4)
+                        #store the cam index in input.json
+                        self.run_state.set_camera_index(int(cam_index))
                         self.logger.info(f'Camera accessed: {cam_index}')
                         break
                     else:
                         print('Choose the camera from the indexes given above')
             else:
-                #store the cam index as dict in input.json
-                with open(self.json_file, 'r') as file:
-                    data = json.load(file)
-                data['camera_index'] = cameras[0]
+                #store the cam index in input.json
+                self.run_state.set_camera_index(cameras[0])
                 self.logger.info(f'Camera accessed: {cameras[0]}')
-                with open(self.json_file, 'w') as file:
-                    json.dump(data, file, indent=4)
         else:
-            self.logger.error("No cameras found.")
\ No newline at end of file
+            self.logger.error("No cameras found.")
+
+    def select_cameras(self):
+        '''
+        Function inputs the camera indexes to capture from at the same time and stores them in the json file; an empty answer selects every camera
+        '''
+        camera_info = self.get_camera_info()
+        cameras = [info["index"] for info in camera_info]
+        if not cameras:
+            self.logger.error("No cameras found.")
+            return
+        if len(cameras)>1:
+            self.logger.info("Available Cameras:")
+            for info in camera_info:
+                self.logger.info(f"  {info['index']}: {info['width']}x{info['height']} @ {info['fps']:.0f} FPS")
+            while True:
+                answer = input('Enter camera indexes to use, separated by commas (empty for all): ').strip()
+                try:
+                    selected = [int(value) for value in answer.split(",")] if answer else cameras
+                except ValueError:
+                    selected = []
+                if selected and all(index in cameras for index in selected):
+                    break
+                print('Choose the cameras from the indexes given above')
+        else:
+            selected = cameras
+        #store the cam indexes in input.json
+        self.run_state.set_camera_indices(selected)
+        self.logger.info(f'Cameras accessed: {selected}')
\ No newline at end of file
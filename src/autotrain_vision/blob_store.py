@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import stat
+import hashlib
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .dataset_stage import link_or_copy
+
+
+class BlobStore:
+    '''
+    Content-addressed store of dataset files under data_folder/.blobs, shared by every training run in data_folder.
+    Each distinct file is kept once, named by its SHA-256, and run folders are hardlink farms into the store plus a manifest of what they reference.
+    File hashes are cached by (path, size, mtime), so importing an unchanged dataset again only stats its files.
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - data_folder (str): Folder holding the training runs; the store lives in its .blobs folder
+        - workers (int): Number of threads hashing and linking files
+    '''
+    manifest_name = ".blob_manifest.json"
+
+    def __init__(self, logger, data_folder, workers=8):
+        self.logger = logger
+        self.data_folder = data_folder
+        self.root = os.path.join(data_folder, ".blobs")
+        self.objects = os.path.join(self.root, "objects")
+        self.hash_cache_file = os.path.join(self.root, "hash_cache.json")
+        self.workers = workers
+        self._cache_lock = threading.Lock()
+        self.hash_cache = self._load_hash_cache()
+        # blobs created by this instance
+        self.new_blobs = 0
+
+    def _load_hash_cache(self):
+        if not os.path.exists(self.hash_cache_file):
+            return {}
+        try:
+            with open(self.hash_cache_file, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            self.logger.warning(f"Ignoring unreadable hash cache {self.hash_cache_file}")
+            return {}
+
+    def _save_hash_cache(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.hash_cache_file + ".tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(self.hash_cache, file)
+        os.replace(tmp_path, self.hash_cache_file)
+
+    def blob_path(self, digest):
+        '''
+        Returns the path of the blob for a SHA-256 hex digest
+        '''
+        return os.path.join(self.objects, digest[:2], digest)
+
+    def file_hash(self, path):
+        '''
+        Returns the SHA-256 of a file, reusing the cached value if its size and mtime are unchanged
+
+        Args:
+            - path (str): Path to the file
+        Returns:
+            - str: Hex digest
+        '''
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        cached = self.hash_cache.get(path)
+        if cached is not None and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        sha = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        with self._cache_lock:
+            self.hash_cache[path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def add(self, path):
+        '''
+        Adds a file to the store if its content is not there yet.
+        New blobs are reflinked or copied, never hardlinked to the source, and made read-only so later edits of the source cannot change them.
+
+        Args:
+            - path (str): Path to the file
+        Returns:
+            - str: Hex digest of the file
+        '''
+        digest = self.file_hash(path)
+        blob = self.blob_path(digest)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            tmp_path = f"{blob}.{threading.get_ident()}.tmp"
+            link_or_copy(path, tmp_path, allow_link=False)
+            os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(tmp_path, blob)
+            with self._cache_lock:
+                self.new_blobs += 1
+        return digest
+
+    def import_folder(self, src_folder, dst_folder, sub_folders=("images", "labels")):
+        '''
+        Adds every file of src_folder's images and labels folders to the store and hardlinks them into dst_folder
+
+        Args:
+            - src_folder (str): Folder containing images and labels folders
+            - dst_folder (str): Run folder to populate
+            - sub_folders (tuple): Sub folders of src_folder to import
+        Returns:
+            - dict: Number of files per method used to place them in dst_folder, plus the number of new blobs
+        '''
+        tasks = []
+        for sub in sub_folders:
+            os.makedirs(os.path.join(dst_folder, sub), exist_ok=True)
+            src_sub = os.path.join(src_folder, sub)
+            if not os.path.isdir(src_sub):
+                continue
+            with os.scandir(src_sub) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        tasks.append((f"{sub}/{entry.name}", entry.path))
+        blobs_before = self.new_blobs
+
+        def run(task):
+            rel_path, path = task
+            digest = self.add(path)
+            return rel_path, digest, link_or_copy(self.blob_path(digest), os.path.join(dst_folder, rel_path))
+        manifest = {}
+        counts = {"link": 0, "reflink": 0, "copy": 0}
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for rel_path, digest, method in pool.map(run, tasks):
+                    manifest[rel_path] = digest
+                    counts[method] += 1
+        finally:
+            self._save_hash_cache()
+            self.write_manifest(dst_folder, manifest)
+        counts["new_blobs"] = self.new_blobs - blobs_before
+        self.logger.info(f"Imported {src_folder} into {dst_folder} through {self.root}: {counts}")
+        return counts
+
+    def write_manifest(self, dst_folder, manifest):
+        '''
+        Records which blobs a run folder references, merging with an existing manifest
+
+        Args:
+            - dst_folder (str): Run folder
+            - manifest (dict): {path relative to dst_folder: hex digest}
+        '''
+        manifest_path = os.path.join(dst_folder, self.manifest_name)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as file:
+                manifest = {**json.load(file), **manifest}
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(manifest, file)
+        os.replace(tmp_path, manifest_path)
+
+    def referenced(self):
+        '''
+        Returns the digests referenced by any manifest under data_folder
+        '''
+        digests = set()
+        for folder, dirs, files in os.walk(self.data_folder):
+            dirs[:] = [d for d in dirs if os.path.join(folder, d) != self.root]
+            if self.manifest_name in files:
+                with open(os.path.join(folder, self.manifest_name), 'r') as file:
+                    digests.update(json.load(file).values())
+        return digests
+
+    def gc(self, dry_run=False):
+        '''
+        Deletes blobs that no manifest references and no run folder hardlinks, and drops hash cache entries for files that no longer exist
+
+        Args:
+            - dry_run (boolean): True to only report what would be deleted
+        Returns:
+            - dict: Number of blobs and bytes removed (or that would be removed)
+        '''
+        referenced = self.referenced()
+        removed = freed = 0
+        for folder, _, files in os.walk(self.objects):
+            for digest in files:
+                blob = os.path.join(folder, digest)
+                st = os.stat(blob)
+                if digest in referenced or st.st_nlink > 1:
+                    continue
+                removed += 1
+                freed += st.st_size
+                if not dry_run:
+                    os.remove(blob)
+        if not dry_run:
+            self.hash_cache = {path: value for path, value in self.hash_cache.items() if os.path.exists(path)}
+            self._save_hash_cache()
+        result = {"removed": removed, "bytes": freed}
+        self.logger.info(f"{'Would remove' if dry_run else 'Removed'} {removed} unreferenced blobs ({freed} bytes) from {self.root}")
+        return result
+
+
+def main(argv=None):
+    '''
+    Command line entry point: python -m autotrain_vision.blob_store gc <data_folder> [--dry-run]
+    '''
+    parser = argparse.ArgumentParser(prog="python -m autotrain_vision.blob_store", description="Maintain the shared dataset blob store of a data_folder")
+    commands = parser.add_subparsers(dest="command", required=True)
+    gc_parser = commands.add_parser("gc", help="delete blobs that no training run references")
+    gc_parser.add_argument("data_folder")
+    gc_parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    store = BlobStore(logging.getLogger("AutoTrain"), args.data_folder)
+    store.gc(dry_run=args.dry_run)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import numpy as np
+
+
+def box_iou(boxes_a, boxes_b):
+    '''
+    Pairwise IoU of two sets of xmin, ymin, xmax, ymax boxes
+
+    Returns:
+        - numpy.ndarray: (len(boxes_a), len(boxes_b)) IoU matrix
+    '''
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    inter = np.prod((bottom_right-top_left).clip(0), axis=2)
+    area_a = np.prod((boxes_a[:, 2:]-boxes_a[:, :2]).clip(0), axis=1)
+    area_b = np.prod((boxes_b[:, 2:]-boxes_b[:, :2]).clip(0), axis=1)
+    return inter/(area_a[:, None]+area_b[None, :]-inter+1e-9)
+
+
+def nms(boxes, scores, iou_threshold):
+    '''
+    Greedy non-maximum suppression
+
+    Args:
+        - boxes (numpy.ndarray): xmin, ymin, xmax, ymax rows
+        - scores (numpy.ndarray): Score per box
+        - iou_threshold (float): Boxes overlapping a kept box by more than this are dropped
+    Returns:
+        - numpy.ndarray: Indices of the kept boxes, highest score first
+    '''
+    areas = (boxes[:, 2]-boxes[:, 0]).clip(0)*(boxes[:, 3]-boxes[:, 1]).clip(0)
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        # IoU of the kept box against every remaining box at once
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = (xx2-xx1).clip(0)*(yy2-yy1).clip(0)
+        iou = inter/(areas[i]+areas[rest]-inter+1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def clip_boxes(boxes, shape):
+    '''
+    Clips xmin, ymin, xmax, ymax boxes to an image, in place
+
+    Args:
+        - boxes (numpy.ndarray): xmin, ymin, xmax, ymax rows
+        - shape (tuple): Image height and width
+    Returns:
+        - numpy.ndarray: boxes
+    '''
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, shape[0])
+    return boxes
+
+
+def xyxy_to_xywhn(boxes, shape):
+    '''
+    Converts xmin, ymin, xmax, ymax boxes in pixels to YOLO's normalized x_center, y_center, width, height
+
+    Args:
+        - boxes (numpy.ndarray): xmin, ymin, xmax, ymax rows
+        - shape (tuple): Image height and width
+    Returns:
+        - numpy.ndarray: Normalized x_center, y_center, width, height rows
+    '''
+    height, width = shape[:2]
+    scale = np.array([width, height, width, height], dtype=np.float32)
+    return np.concatenate(((boxes[:, :2]+boxes[:, 2:])/2, boxes[:, 2:]-boxes[:, :2]), axis=1)/scale
+
+
+def filter_boxes(boxes, scores, shape, score_threshold=0.0, iou_threshold=None, min_size=1.0):
+    '''
+    Thresholds, optionally suppresses overlaps class-agnostically, and clips annotator boxes, all over every box of a frame at once
+
+    Args:
+        - boxes (numpy.ndarray): xmin, ymin, xmax, ymax rows in pixels
+        - scores (numpy.ndarray): Score per box
+        - shape (tuple): Image height and width
+        - score_threshold (float): Boxes scoring lower are dropped
+        - iou_threshold (float): IoU above which the lower scoring of two boxes is dropped; None skips NMS
+        - min_size (float): Boxes narrower or lower than this many pixels after clipping are dropped
+    Returns:
+        - tuple: Kept boxes (float32, highest score first when NMS ran), their scores and their indices into the input
+    '''
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+    keep = np.flatnonzero(scores >= score_threshold)
+    if iou_threshold is not None and len(keep) > 1:
+        keep = keep[nms(boxes[keep], scores[keep], iou_threshold)]
+    kept = clip_boxes(boxes[keep].copy(), shape)
+    sizes = kept[:, 2:]-kept[:, :2]
+    large = (sizes >= min_size).all(axis=1)
+    return kept[large], scores[keep][large], keep[large]
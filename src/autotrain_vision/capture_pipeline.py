@@ -0,0 +1,210 @@
+import os
+import time
+import queue
+import threading
+
+import cv2
+
+
+class StageStats:
+    '''
+    Counts items handled by one pipeline stage and reports its throughput
+
+    Args:
+        - name (str): Name of the stage
+        - queue (queue.Queue): Queue feeding the stage, used to report its depth
+    '''
+    def __init__(self, name, queue=None):
+        self.name = name
+        self.queue = queue
+        self.count = 0
+        self.dropped = 0
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, n=1):
+        with self._lock:
+            self.count += n
+
+    def drop(self, n=1):
+        with self._lock:
+            self.dropped += n
+
+    def snapshot(self):
+        '''
+        Returns:
+            - dict: Items handled, items dropped, items per second and current queue depth
+        '''
+        seconds = time.perf_counter() - self.start
+        return {
+            "count": self.count,
+            "dropped": self.dropped,
+            "per_sec": round(self.count/seconds, 2) if seconds > 0 else 0.0,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+        }
+
+
+class LatestFrameGrabber(threading.Thread):
+    '''
+    Reads frames from a capture on a background thread and keeps only the newest one, so a slow consumer never sees stale frames.
+    Frames replaced before being taken are counted as dropped.
+
+    Args:
+        - capture (cv2.VideoCapture): Opened capture to read from
+        - name (str): Name of the thread and of its stats
+    '''
+    def __init__(self, capture, name="capture"):
+        super().__init__(name=name, daemon=True)
+        self.capture = capture
+        self.stats = StageStats(name)
+        self._cond = threading.Condition()
+        self._frame = None
+        # perf_counter time at which the newest frame was read
+        self._stamp = None
+        self._seq = 0
+        self._taken = 0
+        self._running = True
+
+    def run(self):
+        while self._running:
+            ret, frame = self.capture.read()
+            if not ret:
+                break
+            stamp = time.perf_counter()
+            self.stats.add()
+            with self._cond:
+                if self._frame is not None and self._taken != self._seq:
+                    self.stats.drop()
+                self._frame = frame
+                self._stamp = stamp
+                self._seq += 1
+                self._cond.notify_all()
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+    def latest(self, timeout=1.0, with_time=False):
+        '''
+        Waits for a frame newer than the last one taken and returns it
+
+        Args:
+            - timeout (float): Seconds to wait for a new frame
+            - with_time (boolean): True to also return the time.perf_counter() value at which the frame was read
+        Returns:
+            - numpy.ndarray: Newest frame, or None on timeout or once the capture has ended; a (frame, time) tuple if with_time
+        '''
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq != self._taken or not self._running, timeout=timeout)
+            if self._seq == self._taken:
+                return (None, None) if with_time else None
+            self._taken = self._seq
+            return (self._frame, self._stamp) if with_time else self._frame
+
+    def stop(self):
+        '''
+        Stops reading and waits for the thread to finish
+        '''
+        self._running = False
+        if self.is_alive():
+            self.join(timeout=2.0)
+
+
+def write_sample(img_path, image, txt_path, label_text):
+    '''
+    Encodes an image and writes it together with its YOLO label file
+
+    Args:
+        - img_path (str): Path of the image file to write
+        - image (numpy.ndarray): Image to encode
+        - txt_path (str): Path of the label file to write
+        - label_text (str): Content of the label file
+    '''
+    # imwrite reports a failed write by returning False instead of raising
+    if not cv2.imwrite(img_path, image):
+        raise IOError(f"cv2.imwrite could not write {img_path}")
+    with open(txt_path, 'w') as file:
+        file.write(label_text)
+
+
+class FrameWriter:
+    '''
+    Writes annotated images and labels, either inline or on a pool of background threads fed by a bounded queue
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - threads (int): Number of writer threads; 0 writes inline on the calling thread
+        - queue_size (int): Maximum number of samples waiting to be written
+        - drop_policy (str): "block" to wait for room when the queue is full, "drop" to discard the new sample
+        - shards (ShardWriter): Appends samples to shard files instead of writing an image and a label file each; it is closed by close
+    '''
+    def __init__(self, logger, threads=0, queue_size=32, drop_policy="block", shards=None):
+        if drop_policy not in ("block", "drop"):
+            raise ValueError(f"Unknown drop_policy {drop_policy}, expected 'block' or 'drop'")
+        self.logger = logger
+        self.drop_policy = drop_policy
+        self.shards = shards
+        self.queue = queue.Queue(maxsize=queue_size) if threads > 0 else None
+        self.stats = StageStats("writer", self.queue)
+        self._threads = [threading.Thread(target=self._work, name=f"writer-{i}", daemon=True) for i in range(threads)]
+        for thread in self._threads:
+            thread.start()
+
+    def _work(self):
+        while True:
+            sample = self.queue.get()
+            try:
+                if sample is None:
+                    return
+                self._write(sample)
+            finally:
+                self.queue.task_done()
+
+    def _write(self, sample):
+        '''
+        Returns:
+            - bool: False if the sample could not be written; the error is logged
+        '''
+        try:
+            if self.shards is not None:
+                img_path, image, _, label_text = sample
+                self.shards.add_image(os.path.basename(img_path), image, label_text)
+            else:
+                write_sample(*sample)
+            self.stats.add()
+            self.logger.info(f"{os.path.basename(sample[0])} written!")
+            return True
+        except Exception as e:
+            self.logger.error(f"Could not write {sample[0]}: {e}")
+            return False
+
+    def submit(self, img_path, image, txt_path, label_text):
+        '''
+        Queues an image and its label for writing, or writes them right away without writer threads
+
+        Returns:
+            - bool: False if the sample was dropped because the queue was full, or could not be written inline
+        '''
+        sample = (img_path, image, txt_path, label_text)
+        if self.queue is None:
+            return self._write(sample)
+        if self.drop_policy == "drop":
+            try:
+                self.queue.put_nowait(sample)
+            except queue.Full:
+                self.stats.drop()
+                return False
+        else:
+            self.queue.put(sample)
+        return True
+
+    def close(self):
+        '''
+        Writes everything still queued and stops the writer threads
+        '''
+        if self.queue is not None:
+            for _ in self._threads:
+                self.queue.put(None)
+            for thread in self._threads:
+                thread.join()
+        if self.shards is not None:
+            self.shards.close()
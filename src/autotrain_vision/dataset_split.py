@@ -0,0 +1,112 @@
+import os
+import re
+import random
+
+from .label_store import LabelStore
+
+# suffix Augment adds to every augmented copy of a source image
+AUG_SUFFIX = re.compile(r"_aug_out_\d+$")
+
+
+def group_key(stem):
+    '''
+    Returns the source image an image stem was made from, so augmented variants share a key with their original
+    '''
+    return AUG_SUFFIX.sub("", stem)
+
+
+class DatasetSplit:
+    '''
+    Splits a YOLOv8 dataset (images and labels folders) into train and val without copying it.
+    The split is written either as train.txt/val.txt image lists or as folders of symlinks, and is reproducible for a given seed.
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - dataset_folder (str): Folder containing the images and labels folders to split
+        - split_folder (str): Folder to write the lists or symlink folders into
+        - ratio (float): Fraction of images, or of groups, that go to train
+        - seed (int): Seed for the shuffle
+        - group (boolean): True to keep every _aug_out_N variant of a source image in the same split as the source
+    '''
+    image_extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp')
+
+    def __init__(self, logger, dataset_folder, split_folder, ratio=0.7, seed=0, group=True):
+        self.logger = logger
+        self.dataset_folder = os.path.abspath(dataset_folder)
+        self.split_folder = os.path.abspath(split_folder)
+        self.ratio = ratio
+        self.seed = seed
+        self.group = group
+
+    def split(self):
+        '''
+        Assigns every image to train or val
+
+        Returns:
+            - tuple: Sorted lists of train and val image file names
+        '''
+        images = sorted(name for name in os.listdir(os.path.join(self.dataset_folder, "images")) if name.lower().endswith(self.image_extensions))
+        groups = {}
+        for name in images:
+            stem = os.path.splitext(name)[0]
+            groups.setdefault(group_key(stem) if self.group else stem, []).append(name)
+        keys = sorted(groups)
+        random.Random(self.seed).shuffle(keys)
+        n_train = int(round(len(keys)*self.ratio))
+        # keep at least one group on each side when there are two or more
+        if len(keys) > 1:
+            n_train = min(max(n_train, 1), len(keys)-1)
+        train = sorted(name for key in keys[:n_train] for name in groups[key])
+        val = sorted(name for key in keys[n_train:] for name in groups[key])
+        return train, val
+
+    def log_split(self, train, val):
+        '''
+        Logs the number of images and boxes in each split, reading boxes from the dataset's LabelStore
+        '''
+        labels = LabelStore(self.logger, os.path.join(self.dataset_folder, "labels")).load()
+        for split_name, names in (("train", train), ("val", val)):
+            boxes = sum(len(labels.get(os.path.splitext(name)[0])[0]) for name in names)
+            self.logger.info(f"{split_name}: {len(names)} images, {boxes} boxes")
+
+    def write_lists(self):
+        '''
+        Writes train.txt and val.txt with one absolute image path per line; YOLO finds each label by swapping images for labels in the path
+
+        Returns:
+            - tuple: Paths to train.txt and val.txt
+        '''
+        os.makedirs(self.split_folder, exist_ok=True)
+        train, val = self.split()
+        paths = []
+        for split_name, names in (("train", train), ("val", val)):
+            list_path = os.path.join(self.split_folder, f"{split_name}.txt")
+            with open(list_path, 'w') as file:
+                file.writelines(os.path.join(self.dataset_folder, "images", name)+"\n" for name in names)
+            paths.append(list_path)
+        self.log_split(train, val)
+        return tuple(paths)
+
+    def write_symlinks(self):
+        '''
+        Creates train and val folders of images and labels that symlink into dataset_folder
+
+        Returns:
+            - tuple: Paths to the train and val folders
+        '''
+        train, val = self.split()
+        paths = []
+        for split_name, names in (("train", train), ("val", val)):
+            split_path = os.path.join(self.split_folder, split_name)
+            for sub in ("images", "labels"):
+                os.makedirs(os.path.join(split_path, sub), exist_ok=True)
+            for name in names:
+                label = os.path.splitext(name)[0]+".txt"
+                for sub, file_name in (("images", name), ("labels", label)):
+                    source = os.path.join(self.dataset_folder, sub, file_name)
+                    link = os.path.join(split_path, sub, file_name)
+                    if os.path.exists(source) and not os.path.lexists(link):
+                        os.symlink(source, link)
+            paths.append(split_path)
+        self.log_split(train, val)
+        return tuple(paths)
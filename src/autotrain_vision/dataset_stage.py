@@ -0,0 +1,165 @@
+import os
+import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+# ioctl request number for FICLONE (reflink) on Linux
+FICLONE = 0x40049409
+
+
+def link_or_copy(source_path, destination_path, allow_link=True):
+    '''
+    Places source_path at destination_path using the cheapest method the filesystem supports.
+    Tries a hardlink first, then a reflink (copy-on-write clone), and falls back to a plain copy.
+
+    Args:
+        - source_path (str): Path to the file to stage
+        - destination_path (str): Path where the file should appear
+        - allow_link (boolean): False to skip the hardlink, when the destination must not share its inode with the source
+    Returns:
+        - str: Method used, one of "link", "reflink" or "copy"
+    '''
+    if os.path.lexists(destination_path):
+        os.remove(destination_path)
+    if allow_link:
+        try:
+            os.link(source_path, destination_path)
+            return "link"
+        except OSError:
+            pass
+    if fcntl is not None:
+        try:
+            with open(source_path, 'rb') as src, open(destination_path, 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            shutil.copystat(source_path, destination_path)
+            return "reflink"
+        except OSError:
+            if os.path.exists(destination_path):
+                os.remove(destination_path)
+    shutil.copy2(source_path, destination_path)
+    return "copy"
+
+
+def folder_bytes(folders):
+    '''
+    Disk use of one or more folders, counting every inode once so hardlinked staging is not counted twice and symlinks are not followed
+
+    Args:
+        - folders (list): Folders to walk; missing ones are skipped
+    Returns:
+        - int: Total size in bytes
+    '''
+    seen = set()
+    total = 0
+    for folder in folders:
+        for root, _, files in os.walk(folder):
+            for name in files:
+                st = os.lstat(os.path.join(root, name))
+                if (st.st_dev, st.st_ino) not in seen:
+                    seen.add((st.st_dev, st.st_ino))
+                    total += st.st_size
+    return total
+
+
+class DatasetStage:
+    '''
+    Stages a YOLOv8 dataset (images and labels folders) from one folder into another.
+    Files are hardlinked or reflinked where possible and a manifest records what is already staged, so unchanged files are skipped on later calls.
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - src_folder (str): Folder containing images and labels folders to stage from
+        - dst_folder (str): Folder to stage the images and labels folders into
+    '''
+    manifest_name = ".stage_manifest.json"
+    sub_folders = ("images", "labels")
+
+    def __init__(self, logger, src_folder, dst_folder):
+        self.logger = logger
+        self.src_folder = src_folder
+        self.dst_folder = dst_folder
+        self.manifest_path = os.path.join(self.dst_folder, self.manifest_name)
+
+    def load_manifest(self):
+        '''
+        Returns the manifest of already staged files as {relative path: [size, mtime_ns]}
+        '''
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            self.logger.warning(f"Ignoring unreadable manifest {self.manifest_path}")
+            return {}
+
+    def save_manifest(self, manifest):
+        '''
+        Atomically writes the manifest to dst_folder
+
+        Args:
+            - manifest (dict): Staged files as {relative path: [size, mtime_ns]}
+        '''
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(manifest, file)
+        os.replace(tmp_path, self.manifest_path)
+
+    def stage(self, workers=1):
+        '''
+        Populates dst_folder from src_folder, skipping files whose size and mtime match the manifest.
+
+        Args:
+            - workers (int): Number of threads linking or copying files
+        Returns:
+            - dict: Number of files per method used ("link", "reflink", "copy") plus "skipped"
+        '''
+        manifest = self.load_manifest()
+        counts = {"link": 0, "reflink": 0, "copy": 0, "skipped": 0}
+        # index both folders once, then stage only what changed
+        tasks = []
+        for sub in self.sub_folders:
+            src_sub = os.path.join(self.src_folder, sub)
+            dst_sub = os.path.join(self.dst_folder, sub)
+            os.makedirs(dst_sub, exist_ok=True)
+            if not os.path.isdir(src_sub):
+                continue
+            staged = set(os.listdir(dst_sub))
+            with os.scandir(src_sub) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                    rel_path = f"{sub}/{entry.name}"
+                    signature = [st.st_size, st.st_mtime_ns]
+                    if manifest.get(rel_path) == signature and entry.name in staged:
+                        counts["skipped"] += 1
+                        continue
+                    tasks.append((rel_path, signature, entry.path, os.path.join(dst_sub, entry.name)))
+
+        def run(task):
+            return task, link_or_copy(task[2], task[3])
+        if workers > 1 and len(tasks) > 1:
+            pool = ThreadPoolExecutor(max_workers=workers)
+            results = pool.map(run, tasks)
+        else:
+            pool = None
+            results = map(run, tasks)
+        try:
+            report_every = max(1, len(tasks)//4)
+            for done, (task, method) in enumerate(results, start=1):
+                counts[method] += 1
+                manifest[task[0]] = task[1]
+                if done % report_every == 0 and done < len(tasks):
+                    self.logger.info(f"Staged {done}/{len(tasks)} files into {self.dst_folder}")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            self.save_manifest(manifest)
+        self.logger.info(f"Staged {self.src_folder} into {self.dst_folder}: {counts}")
+        return counts
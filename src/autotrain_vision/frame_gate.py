@@ -0,0 +1,82 @@
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+class FrameGate:
+    '''
+    Cheap pre-filter for the capture loop that skips frames nearly identical to frames already accepted, before the annotator runs.
+    A frame is skipped if its downsampled grayscale difference to the last accepted frame is small, or if its perceptual hash (dHash) is close to one of the recently accepted frames.
+
+    Args:
+        - diff_threshold (float): Mean absolute difference (0-255) to the last accepted frame below which a frame is skipped; 0 disables the check
+        - hash_distance (int): Hamming distance between 64 bit dHashes at or below which a frame is skipped; negative disables the check
+        - history (int): Number of accepted frame hashes kept in the rolling index
+        - diff_size (int): Side length in pixels of the downsampled frame used for the difference
+    '''
+    name = "gate"
+
+    def __init__(self, diff_threshold=2.0, hash_distance=4, history=32, diff_size=32):
+        self.diff_threshold = diff_threshold
+        self.hash_distance = hash_distance
+        self.diff_size = diff_size
+        self.hashes = deque(maxlen=history)
+        self.last_small = None
+        self.seen = 0
+        self.accepted = 0
+        self.skipped_motion = 0
+        self.skipped_hash = 0
+
+    @staticmethod
+    def dhash(gray):
+        '''
+        Computes the 64 bit difference hash of a grayscale image
+
+        Args:
+            - gray (numpy.ndarray): Grayscale image
+        Returns:
+            - int: Hash value
+        '''
+        small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+        bits = small[:, 1:] > small[:, :-1]
+        return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+    def accept(self, frame):
+        '''
+        Decides whether a frame should be annotated, and records it if so
+
+        Args:
+            - frame (numpy.ndarray): BGR camera frame
+        Returns:
+            - bool: False if the frame is nearly identical to an accepted frame
+        '''
+        self.seen += 1
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        small = cv2.resize(gray, (self.diff_size, self.diff_size), interpolation=cv2.INTER_AREA).astype(np.int16)
+        if self.last_small is not None and self.diff_threshold > 0:
+            if np.abs(small - self.last_small).mean() < self.diff_threshold:
+                self.skipped_motion += 1
+                return False
+        frame_hash = self.dhash(gray)
+        if self.hash_distance >= 0:
+            for accepted_hash in self.hashes:
+                if bin(frame_hash ^ accepted_hash).count("1") <= self.hash_distance:
+                    self.skipped_hash += 1
+                    return False
+        self.last_small = small
+        self.hashes.append(frame_hash)
+        self.accepted += 1
+        return True
+
+    def snapshot(self):
+        '''
+        Returns:
+            - dict: Frames seen, accepted, and skipped by the motion and hash checks
+        '''
+        return {
+            "seen": self.seen,
+            "accepted": self.accepted,
+            "skipped_motion": self.skipped_motion,
+            "skipped_hash": self.skipped_hash,
+        }
@@ -0,0 +1,330 @@
+import os
+import re
+import json
+import queue
+import threading
+
+import cv2
+
+from .capture_pipeline import LatestFrameGrabber, StageStats
+
+
+class FrameSource:
+    '''
+    Base class for everything capture_pred can read frames from.
+    Subclasses decode lazily in frames(), yielding one (position, frame) pair at a time.
+
+    Args:
+        - key (str): Stable name of the source, used to match checkpoints
+        - seekable (boolean): True if frames(start) can resume from a position
+        - tag (str): Short name of the source, used in file names when capturing from several sources
+    '''
+    def __init__(self, key, seekable, tag=None):
+        self.key = key
+        self.seekable = seekable
+        self.tag = re.sub(r"[^A-Za-z0-9]+", "-", tag).strip("-") if tag else None
+        self.stats = StageStats("capture")
+
+    def frames(self, start=0):
+        '''
+        Yields (position, frame) pairs, starting at position start for seekable sources
+
+        Args:
+            - start (int): Position of the first frame to yield
+        '''
+        raise NotImplementedError
+
+    def frames_tagged(self, start=0):
+        '''
+        Yields (position, tag, frame) triples; the tag is None for a single source
+        '''
+        for position, frame in self.frames(start):
+            yield position, None, frame
+
+    def all_stats(self):
+        '''
+        Returns the StageStats of this source and of any source it reads from
+        '''
+        return [self.stats]
+
+    def close(self):
+        '''
+        Releases the underlying device or file
+        '''
+
+
+class CameraSource(FrameSource):
+    '''
+    Reads frames from a live camera
+
+    Args:
+        - camera_index (int): Index of the camera to open
+        - latest (boolean): True to read on a background thread that keeps only the newest frame
+    '''
+    def __init__(self, camera_index, latest=False):
+        super().__init__(key=f"camera:{camera_index}", seekable=False, tag=f"cam{camera_index}")
+        self.camera_index = camera_index
+        self.latest = latest
+        self.vid = None
+        self.grabber = None
+
+    def frames(self, start=0):
+        self.vid = cv2.VideoCapture(self.camera_index)
+        if self.latest:
+            self.grabber = LatestFrameGrabber(self.vid)
+            self.grabber.stats = self.stats
+            self.grabber.start()
+        position = 0
+        while True:
+            if self.grabber is not None:
+                frame = self.grabber.latest()
+                if frame is None:
+                    if not self.grabber.is_alive():
+                        break
+                    continue
+            else:
+                ret, frame = self.vid.read()
+                if not ret:
+                    break
+                self.stats.add()
+            yield position, frame
+            position += 1
+
+    def close(self):
+        if self.grabber is not None:
+            self.grabber.stop()
+        if self.vid is not None:
+            self.vid.release()
+
+
+class VideoFileSource(FrameSource):
+    '''
+    Reads frames from a recorded video file
+
+    Args:
+        - video_path (str): Path to the video file
+    '''
+    def __init__(self, video_path):
+        super().__init__(key=f"video:{os.path.abspath(video_path)}", seekable=True, tag=os.path.splitext(os.path.basename(video_path))[0])
+        self.video_path = video_path
+        self.vid = None
+
+    def frames(self, start=0):
+        self.vid = cv2.VideoCapture(self.video_path)
+        if not self.vid.isOpened():
+            raise IOError(f"Could not open video {self.video_path}")
+        if start:
+            self.vid.set(cv2.CAP_PROP_POS_FRAMES, start)
+        position = start
+        while True:
+            ret, frame = self.vid.read()
+            if not ret:
+                break
+            self.stats.add()
+            yield position, frame
+            position += 1
+
+    def close(self):
+        if self.vid is not None:
+            self.vid.release()
+
+
+class ImageDirSource(FrameSource):
+    '''
+    Reads images from a directory in file name order
+
+    Args:
+        - image_dir (str): Path to the directory of images
+    '''
+    image_extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp')
+
+    def __init__(self, image_dir):
+        super().__init__(key=f"images:{os.path.abspath(image_dir)}", seekable=True, tag=os.path.basename(os.path.normpath(image_dir)))
+        self.image_dir = image_dir
+
+    def frames(self, start=0):
+        names = sorted(name for name in os.listdir(self.image_dir) if name.lower().endswith(self.image_extensions))
+        for position in range(start, len(names)):
+            frame = cv2.imread(os.path.join(self.image_dir, names[position]))
+            if frame is None:
+                continue
+            self.stats.add()
+            yield position, frame
+
+
+class MultiSource(FrameSource):
+    '''
+    Reads several sources at once, each on its own thread, into one shared queue.
+    Live cameras drop their oldest queued frame when the queue is full so frames stay fresh; files and directories wait for room.
+    Frames are yielded with their source's tag, and capture_pred fills a quota of images per tag.
+
+    Args:
+        - sources (list): FrameSource instances, or anything open_source accepts
+        - queue_size (int): Maximum number of frames waiting for the annotator
+        - quotas (dict): {tag: images} to take from each source; overrides weights
+        - weights (dict): {tag: weight} to split the image count proportionally; equal weights if None
+    '''
+    def __init__(self, sources, queue_size=8, quotas=None, weights=None):
+        sources = [open_source(source) for source in sources]
+        super().__init__(key="multi:"+"|".join(source.key for source in sources), seekable=False)
+        tags = set()
+        for i, source in enumerate(sources):
+            # keep tags unique, e.g. two directories with the same name
+            if source.tag is None or source.tag in tags:
+                source.tag = f"{source.tag or 'src'}{i}"
+            tags.add(source.tag)
+            source.stats.name = f"capture:{source.tag}"
+        for name, given in (("quotas", quotas), ("weights", weights)):
+            unknown = sorted(set(given or {}) - tags)
+            if unknown:
+                raise ValueError(f"{name} name unknown sources {unknown}; the source tags are {sorted(tags)}")
+        self.sources = sources
+        self.queue_size = queue_size
+        self.quota_counts = quotas
+        self.weights = weights
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._finished = set()
+        self._threads = []
+
+    def quotas(self, total):
+        '''
+        Splits total images across the sources
+
+        Args:
+            - total (int): Number of images to capture
+        Returns:
+            - dict: {tag: images}
+        '''
+        tags = [source.tag for source in self.sources]
+        if self.quota_counts is not None:
+            return {tag: int(self.quota_counts.get(tag, 0)) for tag in tags}
+        weights = [float((self.weights or {}).get(tag, 1.0)) for tag in tags]
+        shares = [total*weight/sum(weights) for weight in weights]
+        counts = [int(share) for share in shares]
+        # hand out what rounding down left over to the largest remainders
+        for i in sorted(range(len(tags)), key=lambda i: counts[i]-shares[i])[:total-sum(counts)]:
+            counts[i] += 1
+        return dict(zip(tags, counts))
+
+    def finish(self, tag):
+        '''
+        Stops reading the source with the given tag, e.g. once its quota is filled
+        '''
+        self._finished.add(tag)
+
+    def _put(self, item, live):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if live:
+                    try:
+                        self._queue.get_nowait()
+                        self.stats.drop()
+                    except queue.Empty:
+                        pass
+
+    def _read(self, source):
+        for _, frame in source.frames(0):
+            if self._stop.is_set() or source.tag in self._finished:
+                break
+            self._put((source.tag, frame), live=not source.seekable)
+
+    def frames_tagged(self, start=0):
+        self._threads = [threading.Thread(target=self._read, args=(source,), name=f"capture-{source.tag}", daemon=True) for source in self.sources]
+        for thread in self._threads:
+            thread.start()
+        position = 0
+        while True:
+            try:
+                tag, frame = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                # every reader has finished and nothing is left to take
+                if not any(thread.is_alive() for thread in self._threads) and self._queue.empty():
+                    break
+                continue
+            self.stats.add()
+            yield position, tag, frame
+            position += 1
+
+    def frames(self, start=0):
+        for position, _, frame in self.frames_tagged(start):
+            yield position, frame
+
+    def all_stats(self):
+        return [self.stats] + [source.stats for source in self.sources]
+
+    def close(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        for source in self.sources:
+            source.close()
+
+
+def open_source(source):
+    '''
+    Builds a FrameSource from a camera index, a video file path or an image directory path
+
+    Args:
+        - source (int or str or FrameSource or list): What to read frames from; a list of several is read concurrently by a MultiSource
+    Returns:
+        - FrameSource: Source for capture_pred
+    '''
+    if isinstance(source, FrameSource):
+        return source
+    if isinstance(source, (list, tuple)):
+        return MultiSource(source)
+    if isinstance(source, int) or (isinstance(source, str) and source.isdigit()):
+        return CameraSource(int(source))
+    if os.path.isdir(source):
+        return ImageDirSource(source)
+    if os.path.isfile(source):
+        return VideoFileSource(source)
+    raise ValueError(f"{source} is not a camera index, video file or image directory")
+
+
+class CaptureCheckpoint:
+    '''
+    Records how far capture_pred got through a seekable source, so an interrupted job resumes where it stopped
+
+    Args:
+        - checkpoint_file (str): Path to the checkpoint JSON file
+    '''
+    def __init__(self, checkpoint_file):
+        self.checkpoint_file = checkpoint_file
+
+    def load(self, source):
+        '''
+        Returns the position to resume from and the number of images already saved for the given source
+
+        Args:
+            - source (FrameSource): Source being captured
+        Returns:
+            - tuple: (next position, images saved); (0, 0) if there is nothing to resume
+        '''
+        if not source.seekable or not os.path.exists(self.checkpoint_file):
+            return 0, 0
+        with open(self.checkpoint_file, 'r') as file:
+            data = json.load(file)
+        if data.get("source") != source.key:
+            return 0, 0
+        return data["position"], data["img_counter"]
+
+    def save(self, source, position, img_counter):
+        '''
+        Atomically stores the next position to read and the number of images saved so far
+
+        Args:
+            - source (FrameSource): Source being captured
+            - position (int): Position of the next frame to read
+            - img_counter (int): Number of images saved so far
+        '''
+        if not source.seekable:
+            return
+        tmp_path = self.checkpoint_file + ".tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump({"source": source.key, "position": position, "img_counter": img_counter}, file)
+        os.replace(tmp_path, self.checkpoint_file)
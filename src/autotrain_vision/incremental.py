@@ -0,0 +1,55 @@
+class HeadRemapper:
+    '''
+    Ultralytics callback that carries a previous model's class head over to a model trained with more (or reordered) classes.
+    Ultralytics skips the whole class convolution of the Detect head when the number of classes changes; this copies back the rows of every class the previous model already knew, matched by name.
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - prev_model (ultralytics.YOLO): Model loaded from the previous best.pt
+        - new_names (list): Class names of the new dataset, in class index order
+    '''
+    def __init__(self, logger, prev_model, new_names):
+        self.logger = logger
+        prev_names = prev_model.names
+        prev_index = {name: index for index, name in prev_names.items()}
+        # (previous class index, new class index) for every class both models share
+        self.mapping = [(prev_index[name], new_index) for new_index, name in enumerate(new_names) if name in prev_index]
+        detect = prev_model.model.model[-1]
+        self.prev_head = [(branch[-1].weight.detach().clone(), branch[-1].bias.detach().clone()) for branch in detect.cv3]
+
+    def __call__(self, trainer):
+        import torch
+        from ultralytics.utils.torch_utils import de_parallel
+        rows_prev = torch.tensor([prev for prev, _ in self.mapping], dtype=torch.long)
+        rows_new = torch.tensor([new for _, new in self.mapping], dtype=torch.long)
+        # the EMA copy is made before this callback runs, so it gets the same rows
+        models = [de_parallel(trainer.model)] + ([trainer.ema.ema] if getattr(trainer, "ema", None) else [])
+        with torch.no_grad():
+            for model in models:
+                detect = model.model[-1]
+                for branch, (weight, bias) in zip(detect.cv3, self.prev_head):
+                    conv = branch[-1]
+                    conv.weight[rows_new.to(conv.weight.device)] = weight[rows_prev].to(conv.weight)
+                    conv.bias[rows_new.to(conv.bias.device)] = bias[rows_prev].to(conv.bias)
+        self.logger.info(f"Warm start: reused the class head for {len(self.mapping)} of {detect.nc} classes")
+
+
+class MapEarlyStop:
+    '''
+    Ultralytics callback that stops training as soon as validation mAP50 reaches map_threshold
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - map_threshold (float): value<=1 ; mAP50 at which training stops
+    '''
+    def __init__(self, logger, map_threshold):
+        self.logger = logger
+        self.map_threshold = map_threshold
+        self.stopped_epoch = None
+
+    def __call__(self, trainer):
+        map50 = (trainer.metrics or {}).get("metrics/mAP50(B)", 0.0)
+        if map50 >= self.map_threshold and not trainer.stop:
+            self.stopped_epoch = trainer.epoch + 1
+            self.logger.info(f"mAP50 {map50:.3f} reached map_threshold {self.map_threshold} after epoch {self.stopped_epoch}, stopping")
+            trainer.stop = True
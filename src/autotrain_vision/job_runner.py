@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+from .auto_train import AutoTrain, configure_logger
+
+# job keys that are not AutoTrain arguments
+JOB_KEYS = ("name", "object_name", "label")
+
+
+def load_spec(spec_file):
+    '''
+    Reads and validates a job spec
+
+    Args:
+        - spec_file (str): Path to a YAML or JSON file with data_folder, optional defaults, and a list of jobs
+    Returns:
+        - dict: The spec, with every job's AutoTrain arguments merged over the defaults; jobs with resume get run_folder "run" unless they name one
+    '''
+    with open(spec_file, 'r') as file:
+        # JSON is valid YAML, so one loader reads both
+        spec = yaml.safe_load(file)
+    if not isinstance(spec, dict) or "data_folder" not in spec or not spec.get("jobs"):
+        raise ValueError(f"{spec_file} needs a data_folder and a non-empty jobs list")
+    defaults = spec.get("defaults") or {}
+    names = set()
+    for i, job in enumerate(spec["jobs"]):
+        for key in ("object_name", "label"):
+            if key not in job:
+                raise ValueError(f"Job {i} in {spec_file} has no {key}")
+        job.setdefault("name", job["label"])
+        if job["name"] in names:
+            raise ValueError(f"Job name {job['name']} is used twice in {spec_file}")
+        names.add(job["name"])
+        job["args"] = {**defaults, **{key: value for key, value in job.items() if key not in JOB_KEYS}}
+        if job["args"].get("resume"):
+            # a fixed run folder, so running the spec again finds the interrupted run
+            job["args"].setdefault("run_folder", "run")
+        if job["args"].get("source") is None:
+            raise ValueError(f"Job {job['name']} needs a source (camera index, video file or image directory); jobs never prompt for a camera")
+    return spec
+
+
+class JobRunner:
+    '''
+    Runs a queue of AutoTrain jobs in one process without prompting.
+    Grounding DINO is loaded once and shared by every job through the model registry, and the next job's data (capture, annotation, augmentation, split) is prepared on a background thread while the current job trains.
+    A result record with the weights path, mAP50 and stage timings is written for each job.
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - spec (dict): Job spec, see load_spec
+    '''
+    def __init__(self, logger, spec):
+        self.logger = logger
+        self.spec = spec
+        self.data_folder = spec["data_folder"]
+        self.results_file = os.path.join(self.data_folder, "job_results.json")
+        self.results = []
+        # set up once here; AutoTrain instances built on the preparation thread then leave the handlers alone
+        autotrain_logger = logging.getLogger(AutoTrain.__name__)
+        if not autotrain_logger.handlers:
+            configure_logger(autotrain_logger)
+
+    def prepare(self, job):
+        '''
+        Builds the job's AutoTrain instance and runs every step before training.
+        Jobs run headless with tracing on, and without the live inference window.
+
+        Returns:
+            - tuple: AutoTrain instance (None if it could not be built), prepared NewData (None on failure, see AutoTrain.prepare_data) and the error traceback if any
+        '''
+        at = None
+        try:
+            # one blob store for the whole spec, so jobs importing the same previous data store it once
+            args = {"trace": True, "blob_folder": self.data_folder, **job["args"], "headless": True, "inference": False}
+            at = AutoTrain(data_folder=os.path.join(self.data_folder, job["name"]), **args)
+            object_name = job["object_name"] if job["object_name"].endswith(".") else job["object_name"]+"."
+            at.setup()
+            at.add_object_label(object_name, job["label"])
+            return at, at.prepare_data(object_name, job["label"]), None
+        except Exception as e:
+            self.logger.error(f"Job {job['name']} failed while preparing data: {e}")
+            return at, None, traceback.format_exc()
+
+    def record(self, job, at, status, weights=None, map50=None, error=None, train_report=None):
+        '''
+        Writes the result of a job into its run folder and appends it to data_folder/job_results.json
+        '''
+        summary = at.tracer.summary() if at is not None else {"spans": {}, "counters": {}}
+        result = {
+            "name": job["name"],
+            "status": status,
+            "run_folder": at.combined_folder if at is not None else None,
+            "weights": weights,
+            "map50": map50,
+            "timings": {name: round(span["total_ms"]/1e3, 3) for name, span in summary["spans"].items() if "." not in name},
+            "counters": summary["counters"],
+            "train_report": train_report or {},
+            "error": error,
+        }
+        self.results.append(result)
+        if at is not None and os.path.isdir(at.combined_folder):
+            at.tracer.export(at.combined_folder)
+            with open(os.path.join(at.combined_folder, "job_result.json"), 'w') as file:
+                json.dump(result, file, indent=2)
+        tmp_path = self.results_file + ".tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(self.results, file, indent=2)
+        os.replace(tmp_path, self.results_file)
+        self.logger.info(f"Job {job['name']}: {status}, weights {weights}, mAP50 {map50}, timings {result['timings']}")
+        return result
+
+    def run(self):
+        '''
+        Runs every job in order, preparing job i+1 while job i trains; a failed job is recorded and the queue moves on
+
+        Returns:
+            - list: One result record per job
+        '''
+        jobs = self.spec["jobs"]
+        os.makedirs(self.data_folder, exist_ok=True)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-prep") as prep:
+            prepared = prep.submit(self.prepare, jobs[0])
+            for i, job in enumerate(jobs):
+                at, zsl, error = prepared.result()
+                # start the next job's data preparation before training this one
+                if i+1 < len(jobs):
+                    prepared = prep.submit(self.prepare, jobs[i+1])
+                if zsl is None:
+                    self.record(job, at, "failed", error=error)
+                    continue
+                try:
+                    weights, map50 = at.train_model(zsl)
+                    self.record(job, at, "trained" if weights else "below_map_threshold", weights=weights, map50=float(map50), train_report=zsl.train_report)
+                except Exception as e:
+                    self.logger.error(f"Job {job['name']} failed while training: {e}")
+                    self.record(job, at, "failed", error=traceback.format_exc())
+        self.logger.info(f"Ran {len(jobs)} jobs in {time.perf_counter()-start:.1f}s, results in {self.results_file}")
+        return self.results
+
+
+def main(argv=None):
+    '''
+    Command line entry point: python -m autotrain_vision.job_runner <spec.yaml>
+    '''
+    parser = argparse.ArgumentParser(prog="python -m autotrain_vision.job_runner", description="Run a queue of AutoTrain jobs without prompting")
+    parser.add_argument("spec", help="YAML or JSON job spec")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    runner = JobRunner(logging.getLogger("JobRunner"), load_spec(args.spec))
+    results = runner.run()
+    return 0 if all(result["status"] == "trained" for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
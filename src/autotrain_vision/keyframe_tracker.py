@@ -0,0 +1,204 @@
+from collections import deque
+
+import cv2
+import numpy as np
+
+from .annotator import Annotator
+from .box_ops import box_iou, clip_boxes
+
+
+class _Track:
+    '''
+    Boxes of one source carried from its last keyframe, with the feature points tracked inside each box
+    '''
+    def __init__(self, gray, boxes, scores, labels, max_points):
+        self.gray = gray
+        self.boxes = boxes
+        self.scores = scores
+        self.labels = labels
+        self.age = 0
+        self.points = []
+        for xmin, ymin, xmax, ymax in boxes.astype(np.int32).tolist():
+            mask = np.zeros(gray.shape, dtype=np.uint8)
+            mask[max(ymin, 0):max(ymax, 0), max(xmin, 0):max(xmax, 0)] = 255
+            points = cv2.goodFeaturesToTrack(gray, maxCorners=max_points, qualityLevel=0.01, minDistance=3, mask=mask)
+            self.points.append(points if points is not None else np.zeros((0, 1, 2), dtype=np.float32))
+
+
+class KeyframeAnnotator(Annotator):
+    '''
+    Runs the detector on keyframes only and carries its boxes to the frames in between with pyramidal Lucas-Kanade optical flow.
+    The detector runs again after interval frames, when the share of reliably tracked points in a box falls below min_confidence,
+    or when a tracked box jumps so that its IoU with its previous position falls below drift_iou.
+    Frames are tracked per source tag, so interleaved frames from several cameras do not mix, and the keyframes of a batch go to the detector together in one call.
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - detector (Annotator): Annotator run on keyframes
+        - interval (int): Maximum number of frames between two detector calls
+        - min_confidence (float): Share (0-1) of a box's points that must track reliably
+        - drift_iou (float): Minimum IoU between a tracked box and its previous position
+        - max_points (int): Feature points tracked per box
+        - fb_error (float): Maximum forward-backward tracking error in pixels for a point to count as reliable
+    '''
+    name = "keyframe"
+
+    def __init__(self, logger, detector, interval=10, min_confidence=0.5, drift_iou=0.5, max_points=30, fb_error=1.0):
+        super().__init__(logger)
+        self.detector = detector
+        self.name = f"keyframe+{detector.name}"
+        self.interval = interval
+        self.min_confidence = min_confidence
+        self.drift_iou = drift_iou
+        self.max_points = max_points
+        self.fb_error = fb_error
+        self.tracks = {}
+        self._prompt = None
+        self.counts = {"frames": 0, "detector_calls": 0, "detector_batches": 0, "tracked": 0}
+        self.reasons = {"first": 0, "interval": 0, "confidence": 0, "drift": 0, "lost": 0}
+        # IoU between the tracked box and the detector's box whenever both exist for the same frame
+        self.agreement = []
+
+    def _track(self, track, gray):
+        '''
+        Moves every box of a track to the new frame
+
+        Returns:
+            - tuple: New boxes, per box confidence, and the tracked points per box
+        '''
+        boxes = track.boxes.copy()
+        confidence = np.zeros(len(boxes), dtype=np.float32)
+        new_points = []
+        for i, points in enumerate(track.points):
+            if len(points) < 3:
+                new_points.append(points)
+                continue
+            forward, status, _ = cv2.calcOpticalFlowPyrLK(track.gray, gray, points, None, winSize=(21, 21), maxLevel=3)
+            backward, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, track.gray, forward, None, winSize=(21, 21), maxLevel=3)
+            error = np.linalg.norm((points-backward).reshape(-1, 2), axis=1)
+            good = (status.ravel() == 1) & (back_status.ravel() == 1) & (error < self.fb_error)
+            confidence[i] = good.mean()
+            if good.sum() < 3:
+                new_points.append(points[:0])
+                continue
+            old, new = points.reshape(-1, 2)[good], forward.reshape(-1, 2)[good]
+            shift = np.median(new-old, axis=0)
+            # scale from how far the points spread around their median, before and after
+            spread_old = np.median(np.linalg.norm(old-np.median(old, axis=0), axis=1))
+            spread_new = np.median(np.linalg.norm(new-np.median(new, axis=0), axis=1))
+            scale = spread_new/spread_old if spread_old > 1e-3 else 1.0
+            center = (boxes[i, :2]+boxes[i, 2:])/2+shift
+            half = (boxes[i, 2:]-boxes[i, :2])/2*scale
+            boxes[i] = np.concatenate((center-half, center+half))
+            new_points.append(new.reshape(-1, 1, 2).astype(np.float32))
+        return boxes, confidence, new_points
+
+    def _redetect_reason(self, track, boxes, confidence, shape):
+        if track is None:
+            return "first"
+        if track.age >= self.interval:
+            return "interval"
+        if len(boxes) == 0:
+            return "lost"
+        if confidence.min() < self.min_confidence:
+            return "confidence"
+        if np.diag(box_iou(track.boxes, boxes)).min() < self.drift_iou:
+            return "drift"
+        height, width = shape
+        if (boxes[:, 2] <= 0).any() or (boxes[:, 3] <= 0).any() or (boxes[:, 0] >= width).any() or (boxes[:, 1] >= height).any():
+            return "lost"
+        return None
+
+    def _track_one(self, gray, tag):
+        '''
+        Carries the tag's boxes to a frame
+
+        Returns:
+            - tuple: The frame's result and None if tracking held, else None and the tracked boxes (None without a track) to compare with the detector's
+        '''
+        track = self.tracks.get(tag)
+        boxes = confidence = points = None
+        if track is not None:
+            boxes, confidence, points = self._track(track, gray)
+        reason = self._redetect_reason(track, boxes, confidence, gray.shape)
+        self.counts["frames"] += 1
+        if reason is None:
+            self.counts["tracked"] += 1
+            track.boxes, track.points, track.gray = boxes, points, gray
+            track.age += 1
+            return {"boxes": clip_boxes(boxes.copy(), gray.shape), "scores": track.scores, "labels": track.labels, "tracked": True, "confidence": confidence}, None
+        self.reasons[reason] += 1
+        return None, boxes
+
+    def _keyframe(self, gray, tag, boxes, result):
+        '''
+        Starts the tag's new track from the detector's result for a keyframe
+        '''
+        detected = np.asarray(result["boxes"], dtype=np.float32).reshape(-1, 4)
+        if boxes is not None and len(boxes) and len(detected):
+            self.agreement.extend(box_iou(detected, boxes).max(axis=1).tolist())
+        if len(detected):
+            self.tracks[tag] = _Track(gray, detected, np.asarray(result["scores"], dtype=np.float32), list(result["labels"]), self.max_points)
+        else:
+            self.tracks.pop(tag, None)
+        return {**result, "tracked": False}
+
+    def annotate(self, color_frames, prompt, box_threshold=0.6, text_threshold=0.4, tags=None):
+        '''
+        Annotates frames in order, detecting on keyframes and tracking in between; see Annotator.annotate
+
+        Args:
+            - tags (list): Source tag per frame, so each source is tracked separately; one shared track if None
+        Returns:
+            - list: One dict per frame as from Annotator.annotate, plus "tracked" (boolean); tracked boxes keep their keyframe scores and add the per box tracking "confidence"
+        '''
+        if prompt != self._prompt:
+            # boxes of another object are no use
+            self._prompt = prompt
+            self.tracks = {}
+        self._tags = tags if tags is not None else [None]*len(color_frames)
+        return super().annotate(color_frames, prompt, box_threshold, text_threshold)
+
+    def _annotate(self, color_frames, prompt, box_threshold, text_threshold):
+        grays = [cv2.cvtColor(color_frame, cv2.COLOR_RGB2GRAY) for color_frame in color_frames]
+        results = [None]*len(color_frames)
+        # frame indices per tag, in order; a tag's frames after a keyframe wait for the boxes detected on it
+        pending = {}
+        for i, tag in enumerate(self._tags):
+            pending.setdefault(tag, deque()).append(i)
+        while pending:
+            # track every tag up to its next keyframe, then detect on the keyframes of all tags in one batch
+            keyframes = []
+            for tag in list(pending):
+                frames = pending[tag]
+                while frames:
+                    i = frames.popleft()
+                    results[i], boxes = self._track_one(grays[i], tag)
+                    if results[i] is None:
+                        keyframes.append((i, tag, boxes))
+                        break
+                if not frames:
+                    del pending[tag]
+            if keyframes:
+                self.counts["detector_calls"] += len(keyframes)
+                self.counts["detector_batches"] += 1
+                detections = self.detector.annotate([color_frames[i] for i, _, _ in keyframes], prompt, box_threshold, text_threshold)
+                for (i, tag, boxes), result in zip(keyframes, detections):
+                    results[i] = self._keyframe(grays[i], tag, boxes, result)
+        return results
+
+    def report(self):
+        '''
+        Returns:
+            - dict: Per-frame latency, frames seen, detector calls (frames detected) and batched detector runs, calls saved, why the detector ran, and tracked/detected box agreement
+        '''
+        frames = self.counts["frames"]
+        return {
+            **super().report(),
+            **self.counts,
+            "calls_saved": frames-self.counts["detector_calls"],
+            "calls_saved_pct": round(100*(frames-self.counts["detector_calls"])/frames, 1) if frames else 0.0,
+            "redetect_reasons": dict(self.reasons),
+            "detector_latency_ms": self.detector.latency(),
+            "agreement_iou": {"count": len(self.agreement), "mean": round(float(np.mean(self.agreement)), 3) if self.agreement else None},
+        }
@@ -0,0 +1,157 @@
+import os
+
+import numpy as np
+
+
+def format_labels(cls, boxes):
+    '''
+    Formats boxes as the text of a YOLO label file
+
+    Args:
+        - cls (numpy.ndarray): Class index per box
+        - boxes (numpy.ndarray): Normalized x_center, y_center, width, height rows
+    Returns:
+        - str: One "class xc yc w h" line per box
+    '''
+    lines = [f"{c} {xc:.6f} {yc:.6f} {w:.6f} {h:.6f}" for c, (xc, yc, w, h) in zip(np.asarray(cls).tolist(), np.asarray(boxes).reshape(-1, 4).tolist())]
+    return "".join(line+"\n" for line in lines)
+
+
+class LabelStore:
+    '''
+    Columnar index of every YOLO label file in a folder, loaded in bulk into NumPy arrays.
+    Box rows for label file i are cls[offsets[i]:offsets[i+1]] and boxes[offsets[i]:offsets[i+1]].
+    The index is cached in one .npz file next to the labels folder and rebuilt when any label file's size or mtime changes.
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - labels_folder (str): Folder containing YOLO format .txt label files
+        - cache_file (str): Path of the cache file; defaults to .labels_cache.npz in the parent of labels_folder
+    '''
+    def __init__(self, logger, labels_folder, cache_file=None):
+        self.logger = logger
+        self.labels_folder = labels_folder
+        self.cache_file = cache_file or os.path.join(os.path.dirname(os.path.abspath(labels_folder)), ".labels_cache.npz")
+        self.stems = np.array([], dtype=str)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.cls = np.zeros(0, dtype=np.int32)
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self._index = {}
+
+    def scan(self):
+        '''
+        Lists label files with their size and mtime
+
+        Returns:
+            - tuple: Sorted file names, sizes and mtimes (ns) as NumPy arrays
+        '''
+        names, sizes, mtimes = [], [], []
+        with os.scandir(self.labels_folder) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".txt"):
+                    st = entry.stat()
+                    names.append(entry.name)
+                    sizes.append(st.st_size)
+                    mtimes.append(st.st_mtime_ns)
+        order = np.argsort(names) if names else np.zeros(0, dtype=np.int64)
+        return np.array(names, dtype=str)[order], np.array(sizes, dtype=np.int64)[order], np.array(mtimes, dtype=np.int64)[order]
+
+    def load(self):
+        '''
+        Loads the index from the cache if it is still valid, otherwise parses every label file and rewrites the cache
+
+        Returns:
+            - LabelStore: self, for chaining
+        '''
+        names, sizes, mtimes = self.scan()
+        if os.path.exists(self.cache_file):
+            try:
+                with np.load(self.cache_file, allow_pickle=False) as cache:
+                    if np.array_equal(cache["names"], names) and np.array_equal(cache["sizes"], sizes) and np.array_equal(cache["mtimes"], mtimes):
+                        self._set(cache["names"], cache["offsets"], cache["cls"], cache["boxes"])
+                        return self
+            except (OSError, ValueError, KeyError):
+                self.logger.warning(f"Ignoring unreadable label cache {self.cache_file}")
+        self._parse(names)
+        tmp_path = self.cache_file + ".tmp.npz"
+        np.savez(tmp_path, names=names, sizes=sizes, mtimes=mtimes, offsets=self.offsets, cls=self.cls, boxes=self.boxes)
+        os.replace(tmp_path, self.cache_file)
+        self.logger.info(f"Indexed {len(names)} label files with {len(self.cls)} boxes from {self.labels_folder}")
+        return self
+
+    def _parse(self, names):
+        counts = []
+        tokens = []
+        for name in names:
+            with open(os.path.join(self.labels_folder, name), "r") as file:
+                rows = [line.split() for line in file.read().splitlines()]
+            # skip blank lines and non-box rows such as segmentation polygons
+            rows = [row for row in rows if len(row) == 5]
+            counts.append(len(rows))
+            for row in rows:
+                tokens.extend(row)
+        # one bulk string to float conversion for every token of every file
+        values = np.array(tokens, dtype=np.float64).reshape(-1, 5)
+        offsets = np.zeros(len(names)+1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        self._set(names, offsets, values[:, 0].astype(np.int32), values[:, 1:].astype(np.float32))
+
+    def _set(self, names, offsets, cls, boxes):
+        self.stems = np.array([os.path.splitext(name)[0] for name in names], dtype=str)
+        self.offsets = offsets
+        self.cls = cls
+        self.boxes = boxes
+        self._index = {stem: i for i, stem in enumerate(self.stems.tolist())}
+
+    def __len__(self):
+        return len(self.stems)
+
+    def __contains__(self, stem):
+        return stem in self._index
+
+    def get(self, stem):
+        '''
+        Returns the boxes of one label file
+
+        Args:
+            - stem (str): Label file name without extension
+        Returns:
+            - tuple: (cls, boxes) NumPy array views; empty if there is no label file
+        '''
+        i = self._index.get(stem)
+        if i is None:
+            return self.cls[:0], self.boxes[:0]
+        start, end = self.offsets[i], self.offsets[i+1]
+        return self.cls[start:end], self.boxes[start:end]
+
+    def album_bboxes(self, stem, class_names):
+        '''
+        Returns the boxes of one label file in the format used by Augment
+
+        Args:
+            - stem (str): Label file name without extension
+            - class_names (list): List of class names corresponding to class numbers
+        Returns:
+            - list: A list of lists, each containing [x_center, y_center, width, height, class_name]
+        '''
+        cls, boxes = self.get(stem)
+        # round away float32 noise so values like 0.2 stay 0.2
+        return [box + [class_names[c]] for box, c in zip(np.round(boxes.astype(np.float64), 6).tolist(), cls.tolist())]
+
+    @staticmethod
+    def write(labels_folder, items):
+        '''
+        Writes many YOLO label files in one call
+
+        Args:
+            - labels_folder (str): Folder to write the label files into
+            - items (iterable): (stem, cls, boxes) tuples, with boxes as normalized x_center, y_center, width, height rows
+        Returns:
+            - int: Number of label files written
+        '''
+        written = 0
+        for stem, cls, boxes in items:
+            with open(os.path.join(labels_folder, f"{stem}.txt"), "w") as file:
+                file.write(format_labels(cls, boxes))
+            written += 1
+        return written
@@ -0,0 +1,272 @@
+import sys
+import json
+import time
+import queue
+import logging
+import argparse
+import threading
+
+import cv2
+import numpy as np
+
+from .model_registry import MODEL_REGISTRY
+from .capture_pipeline import LatestFrameGrabber, StageStats
+from .tracing import Tracer
+
+
+class YoloBackend:
+    '''
+    Runs a YOLOv8 weights file through ultralytics and returns detections as NumPy arrays
+
+    Args:
+        - weights (str): Path to a '.pt' weights file
+        - device (str or torch.device): Device to run on; picked like NewData.device if None
+    '''
+    def __init__(self, weights, device=None):
+        import torch
+        from ultralytics import YOLO
+        self.device = device if device is not None else torch.device(0 if torch.cuda.is_available() else ("mps" if torch.backends.mps.is_available() else "cpu"))
+        self.model = MODEL_REGISTRY.get(f"yolo:{weights}:{self.device}", lambda: YOLO(weights).to(self.device))
+        self.names = dict(self.model.names)
+
+    def __call__(self, frame, conf):
+        '''
+        Args:
+            - frame (numpy.ndarray): BGR image
+            - conf (float): Minimum confidence score
+        Returns:
+            - tuple: xmin, ymin, xmax, ymax rows (numpy.ndarray), scores and class indices
+        '''
+        boxes = self.model(frame, conf=conf, device=self.device, verbose=False)[0].boxes
+        return boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy().astype(np.int64)
+
+
+class VideoSink:
+    '''
+    Writes annotated frames to a video file, opened on the first frame so its size matches the source
+
+    Args:
+        - path (str): Path of the video file
+        - fps (float): Frame rate written into the file
+        - fourcc (str): Four character codec code
+    '''
+    def __init__(self, path, fps=30.0, fourcc="mp4v"):
+        self.path = path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.writer = None
+
+    def write(self, frame, record):
+        if self.writer is None:
+            height, width = frame.shape[:2]
+            self.writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, (width, height))
+        self.writer.write(frame)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+
+
+class JsonSink:
+    '''
+    Writes one JSON line of detections per inferred frame
+
+    Args:
+        - path (str): Path of the .jsonl file, or "-" for stdout
+    '''
+    def __init__(self, path):
+        self.file = sys.stdout if path == "-" else open(path, 'w')
+
+    def write(self, frame, record):
+        self.file.write(json.dumps(record)+"\n")
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+class LiveInference:
+    '''
+    Low-latency live inference on any YOLOv8 weights file, separate from training.
+    A capture thread keeps only the newest frame, an inference thread runs the model on it, and the calling thread draws, displays and writes to the sinks.
+    Frames that arrive while the model is busy are skipped instead of queued, so latency stays at about one inference.
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - backend (callable): Returns (boxes, scores, cls) for a frame and a confidence threshold, e.g. YoloBackend; needs a names dict attribute unless names is given
+        - source (int or str): Camera index or video file
+        - conf (float): value<=1 ; Threshold for inference confidence score
+        - names (list): Class names by index; defaults to the backend's names
+        - show (boolean): False to run headless without a display window
+        - sinks (list): Objects with write(frame, record) and close(), e.g. VideoSink and JsonSink
+        - report_every (float): Seconds between FPS and latency log lines
+    '''
+    def __init__(self, logger, backend, source=0, conf=0.4, names=None, show=True, sinks=(), report_every=5.0):
+        self.logger = logger
+        self.backend = backend
+        self.source = source
+        self.conf = conf
+        names = names if names is not None else backend.names
+        # resolved once instead of per box
+        self.labels = dict(enumerate(names)) if isinstance(names, (list, tuple)) else dict(names)
+        self.show = show
+        self.sinks = list(sinks)
+        self.report_every = report_every
+        # latency percentiles over a recent window, so a cell running for days keeps constant memory and report cost
+        self.tracer = Tracer(max_samples=2048)
+        self.capture_stats = StageStats("capture")
+        self.inference_stats = StageStats("inference")
+        # results waiting to be drawn; older ones are dropped rather than delaying new ones
+        self.results = queue.Queue(maxsize=2)
+        self._running = False
+        self._error = None
+
+    def _offer(self, result):
+        # keep the newest results; drop the oldest one waiting if the drawing side is behind
+        while True:
+            try:
+                self.results.put_nowait(result)
+                return
+            except queue.Full:
+                try:
+                    self.results.get_nowait()
+                    self.inference_stats.drop()
+                except queue.Empty:
+                    pass
+
+    def _infer(self, grabber):
+        try:
+            while self._running:
+                frame, stamp = grabber.latest(timeout=0.5, with_time=True)
+                if frame is None:
+                    if not grabber.is_alive():
+                        break
+                    continue
+                start = time.perf_counter()
+                boxes, scores, cls = self.backend(frame, self.conf)
+                self.tracer.observe("inference_ms", (time.perf_counter()-start)*1e3)
+                self.inference_stats.add()
+                self._offer((frame, stamp, boxes, scores, cls))
+        except Exception as e:
+            self._error = e
+        finally:
+            # tells run() that no more results are coming
+            self._offer(None)
+
+    def draw(self, frame, boxes, scores, cls):
+        '''
+        Draws boxes with their class name and confidence onto frame
+        '''
+        for (x1, y1, x2, y2), score, c in zip(boxes.astype(np.int32).tolist(), scores.tolist(), cls.tolist()):
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(frame, f"{self.labels.get(c, c)}: {score*100:.1f}%", (x1, y1), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+        return frame
+
+    def stats(self, elapsed):
+        '''
+        Returns:
+            - dict: Frames captured, dropped and inferred, FPS, and end-to-end and inference latency percentiles in ms
+        '''
+        histograms = self.tracer.summary()["histograms"]
+        inferred = self.inference_stats.count
+        return {
+            "captured": self.capture_stats.count,
+            "skipped": self.capture_stats.dropped,
+            "inferred": inferred,
+            "fps": round(inferred/elapsed, 2) if elapsed > 0 else 0.0,
+            "latency_ms": histograms.get("latency_ms", {}),
+            "inference_ms": histograms.get("inference_ms", {}),
+        }
+
+    def run(self, max_frames=None):
+        '''
+        Runs until ESC is pressed, the source ends or max_frames frames were inferred
+
+        Args:
+            - max_frames (int): Number of inferred frames to stop after; None runs until stopped
+        Returns:
+            - dict: Final stats, see stats
+        '''
+        capture = cv2.VideoCapture(self.source)
+        if not capture.isOpened():
+            raise IOError(f"Could not open {self.source}")
+        grabber = LatestFrameGrabber(capture)
+        self.capture_stats = grabber.stats
+        worker = threading.Thread(target=self._infer, args=(grabber,), name="inference", daemon=True)
+        self._running = True
+        start = last_report = time.perf_counter()
+        frames = 0
+        grabber.start()
+        worker.start()
+        try:
+            while True:
+                result = self.results.get()
+                if result is None:
+                    break
+                frame, stamp, boxes, scores, cls = result
+                self.draw(frame, boxes, scores, cls)
+                if self.sinks:
+                    record = {"frame": frames, "time": round(stamp-start, 4), "detections": [{"label": self.labels.get(c, c), "confidence": round(score, 4), "box": [round(v, 1) for v in box]} for box, score, c in zip(boxes.tolist(), scores.tolist(), cls.tolist())]}
+                    for sink in self.sinks:
+                        sink.write(frame, record)
+                # end to end: from the frame being read to it being shown and written
+                self.tracer.observe("latency_ms", (time.perf_counter()-stamp)*1e3)
+                frames += 1
+                if self.show:
+                    cv2.imshow('Inference', frame)
+                    if cv2.waitKey(1) & 0xFF == 27: #ESC Key to exit
+                        break
+                now = time.perf_counter()
+                if now - last_report >= self.report_every:
+                    last_report = now
+                    stats = self.stats(now-start)
+                    self.logger.info(f"Live inference: {stats['fps']} FPS, latency p50 {stats['latency_ms'].get('p50')} ms, p95 {stats['latency_ms'].get('p95')} ms, {stats['skipped']} frames skipped")
+                if max_frames is not None and frames >= max_frames:
+                    break
+        finally:
+            self._running = False
+            grabber.stop()
+            worker.join(timeout=2.0)
+            capture.release()
+            for sink in self.sinks:
+                sink.close()
+            if self.show:
+                cv2.destroyAllWindows()
+        if self._error is not None:
+            raise self._error
+        stats = self.stats(time.perf_counter()-start)
+        self.logger.info(f"Live inference stats: {stats}")
+        return stats
+
+
+def main(argv=None):
+    '''
+    Command line entry point: python -m autotrain_vision.live_inference <weights.pt or .onnx> [--source 0] [--headless] [--video out.mp4] [--json out.jsonl]
+    '''
+    parser = argparse.ArgumentParser(prog="python -m autotrain_vision.live_inference", description="Run live inference with a trained YOLOv8 weights file")
+    parser.add_argument("weights", help="path to a .pt weights file, or an exported .onnx file to run through ONNX Runtime")
+    parser.add_argument("--source", default="0", help="camera index or video file")
+    parser.add_argument("--conf", type=float, default=0.4, help="confidence threshold")
+    parser.add_argument("--headless", action="store_true", help="do not open a display window")
+    parser.add_argument("--video", help="write annotated frames to this video file")
+    parser.add_argument("--json", help="write detections as JSON lines to this file, or - for stdout")
+    parser.add_argument("--max-frames", type=int, help="stop after this many inferred frames")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sinks = ([VideoSink(args.video)] if args.video else []) + ([JsonSink(args.json)] if args.json else [])
+    source = int(args.source) if args.source.isdigit() else args.source
+    if args.weights.endswith(".onnx"):
+        from .onnx_backend import OnnxBackend
+        backend = OnnxBackend(args.weights)
+    else:
+        backend = YoloBackend(args.weights)
+    live = LiveInference(logging.getLogger("AutoTrain"), backend, source=source, conf=args.conf, show=not args.headless, sinks=sinks)
+    live.run(max_frames=args.max_frames)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
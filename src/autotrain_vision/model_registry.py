@@ -0,0 +1,60 @@
+import time
+import logging
+import threading
+
+
+class ModelRegistry:
+    '''
+    Process-wide cache of loaded models. Each model is loaded on first use and then shared by every NewData instance and AutoTrain run in the process.
+    Only register models that are not modified in place (annotators, inference weights); training mutates its YOLO model, so it is not cached here.
+
+    Args:
+        - logger (object instance): Logger instance for reporting load times
+    '''
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger("AutoTrain")
+        self.models = {}
+        # seconds spent loading each model
+        self.load_times = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get(self, key, loader):
+        '''
+        Returns the model stored under key, calling loader to load it the first time
+
+        Args:
+            - key (str): Unique name of the model, including anything that changes what loader returns (path, device)
+            - loader (callable): Function with no arguments that loads and returns the model
+        Returns:
+            - object: The loaded model
+        '''
+        if key in self.models:
+            return self.models[key]
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # load different models concurrently, but each one only once
+        with key_lock:
+            if key not in self.models:
+                start = time.perf_counter()
+                self.models[key] = loader()
+                self.load_times[key] = round(time.perf_counter() - start, 3)
+                self.logger.info(f"Loaded {key} in {self.load_times[key]}s")
+        return self.models[key]
+
+    def evict(self, key=None):
+        '''
+        Drops a cached model, or every cached model if key is None
+
+        Args:
+            - key (str): Name of the model to drop
+        '''
+        with self._lock:
+            if key is None:
+                self.models.clear()
+            else:
+                self.models.pop(key, None)
+
+
+# registry shared by the whole process
+MODEL_REGISTRY = ModelRegistry()
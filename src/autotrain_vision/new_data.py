@@ -1,14 +1,22 @@
 import os
-import torch
 import cv2
-import json
+import time
 import yaml
-import splitfolders
 import numpy as np
-from PIL import Image
 from datetime import datetime
-from transformers import AutoProcessor, AutoModelForZeroShotObjectDetection
-from ultralytics import YOLO
+
+# torch, ultralytics and splitfolders are imported where they are used, so importing the package stays fast
+from .annotator import GroundingDinoAnnotator
+from .capture_pipeline import FrameWriter, StageStats
+from .frame_source import CameraSource, CaptureCheckpoint, MultiSource, open_source
+from .dataset_split import DatasetSplit
+from .shard_store import ShardWriter
+from .box_ops import filter_boxes, xyxy_to_xywhn
+from .label_store import format_labels
+from .incremental import HeadRemapper, MapEarlyStop
+from .tracing import NULL_TRACER
+from .live_inference import LiveInference, YoloBackend
+from .onnx_backend import OnnxBackend, export_onnx as export_onnx_file
 
 
 class NewData:
@@ -18,137 +26,263 @@ class NewData:
     Args:
         - logger (object instance): Logger instance for adding logs
         - combined_folder (str): Path to local folder to store the new data
-        - json_file (str): Path to inputs.json file used for training new data
+        - run_state (RunState): Shared in-memory state of the run's inputs.json
         - object_name (str): Generic object name to detect
         - image_threshold (int): Number of images to capture for creating new dataset
         - epochs (int): Number of epochs for training
         - map_threshold (float): value<=1 ; Threshold to compare mAP50 score
         - inference (boolean): True to perform the inference on live feed
         - inference_threshold (float): value<=1 ; Threshold for inference confidence score
+        - tracer (Tracer): Records capture spans, frame counters and annotation latency; tracing is off if None
+        - annotator (Annotator): Annotator for captured frames; Grounding DINO on the best available device if None
+        - live_source (int or str): Camera index or video file for live inference after training; the selected camera if None
+        - show (boolean): False to run live inference without a display window
     '''
-    def __init__(self, logger, combined_folder, json_file, object_name, image_threshold, epochs, map_threshold, inference, inference_threshold):
+    def __init__(self, logger, combined_folder, run_state, object_name, image_threshold, epochs, map_threshold, inference, inference_threshold, tracer=None, annotator=None, live_source=None, show=True):
         self.logger = logger
         self.combined_folder = combined_folder
-        self.json_file = json_file
+        self.run_state = run_state
         self.object_name = object_name
         self.image_threshold = image_threshold
         self.epochs = epochs
         self.map_threshold = map_threshold
         self.inference = inference
         self.inference_threshold = inference_threshold
+        self.tracer = tracer or NULL_TRACER
+        self.live_source = live_source
+        self.show = show
 
         self.timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        self.device = torch.device(0 if torch.cuda.is_available() else ("mps" if torch.backends.mps.is_available() else "cpu"))
-        self.processor = AutoProcessor.from_pretrained("IDEA-Research/grounding-dino-tiny")
-        self.model = AutoModelForZeroShotObjectDetection.from_pretrained("IDEA-Research/grounding-dino-tiny").to(self.device)
-        self.model_yolov8 = YOLO('yolov8n.pt')
+        # stages of the current or last capture_pred call, see capture_stats
+        self.capture_stages = []
+        self.annotator = annotator or GroundingDinoAnnotator(logger)
+        self._device = None
+        # created fresh by train()
+        self.model_yolov8 = None
+        self.train_report = {}
+        self.annotation_report = {}
 
-    def owl_pred_live(self, color_frame, box_threshold=0.6, text_threshold=0.4):
+    @property
+    def device(self):
+        '''
+        Device used for training, picked on first use
         '''
-        Annotate live images using Grounding DINO
+        if self._device is None:
+            import torch
+            self._device = torch.device(0 if torch.cuda.is_available() else ("mps" if torch.backends.mps.is_available() else "cpu"))
+        return self._device
+
+    def owl_pred_batch(self, color_frames, box_threshold=0.6, text_threshold=0.4, tags=None):
+        '''
+        Annotate a batch of images with the annotator in one forward pass
 
         Args:
-            - color_frame (numpy.ndarray): Camera input image
+            - color_frames (list): RGB images (numpy.ndarray) to annotate
             - box_threshold (float): Box threshold for Grounding DINO
             - text_threshold (float): Text threshold for Grounding DINO
+            - tags (list): Source tag per frame, for annotators that track objects from frame to frame
         Returns:
-            - tuple: A tuple of numpy array for Grounding DINO results, xmin, ymin, xmax, ymax of resulting bounding boxes
+            - list: One dict per frame with "boxes" (numpy.ndarray of xmin, ymin, xmax, ymax rows), "scores" (numpy.ndarray) and "labels" (list)
         '''
-        xmin = ymin = xmax = ymax = None
-        image = Image.fromarray(color_frame)  # for live feed
-       
-        inputs = self.processor(text=self.object_name, images=image, return_tensors="pt").to(self.device)
-        torch.cuda.empty_cache()
+        return self.annotator.annotate(color_frames, self.object_name, box_threshold, text_threshold, tags=tags)
 
-        with torch.no_grad():
-            with torch.cuda.amp.autocast():
-                outputs = self.model(**inputs)
-        results = self.processor.post_process_grounded_object_detection(outputs, inputs.input_ids, box_threshold=box_threshold, text_threshold=text_threshold, target_sizes=[image.size[::-1]])
-        result = results[0]
+    def owl_pred_live(self, color_frame, box_threshold=0.6, text_threshold=0.4, nms_iou=None):
+        '''
+        Annotate live images with the annotator, keeping every box like capture_pred
 
-        if len(result['labels']) != 0:  # Check if labels list is not empty
-            xyxy = result["boxes"][0]
-            xmin, ymin, xmax, ymax = xyxy[0].item(), xyxy[1].item(), xyxy[2].item(), xyxy[3].item()
-        return results, xmin, ymin, xmax, ymax
+        Args:
+            - color_frame (numpy.ndarray): Camera input image
+            - box_threshold (float): Box threshold for Grounding DINO
+            - text_threshold (float): Text threshold for Grounding DINO
+            - nms_iou (float): IoU above which overlapping boxes are merged into the higher scoring one; None keeps every box
+        Returns:
+            - tuple: The Grounding DINO results (see owl_pred_batch), the kept xmin, ymin, xmax, ymax boxes in pixels (numpy.ndarray) and the same boxes as YOLO's normalized x_center, y_center, width, height
+        '''
+        results = self.owl_pred_batch([color_frame], box_threshold, text_threshold)
+        boxes, _, _ = filter_boxes(results[0]["boxes"], results[0]["scores"], color_frame.shape[:2], score_threshold=box_threshold, iou_threshold=nms_iou)
+        return results, boxes, xyxy_to_xywhn(boxes, color_frame.shape[:2])
 
-    def capture_pred(self, box_threshold, text_threshold):
+    def capture_pred(self, box_threshold, text_threshold, pipeline=False, writer_threads=2, queue_size=32, drop_policy="block", batch_size=1, source=None, headless=False, checkpoint_every=50, gate=None, shards=False, nms_iou=None):
         '''
         Capture and store annotated images and labels
 
         Args:
             - box_threshold (float): Box threshold for Grounding DINO
             - text_threshold (float): Text threshold for Grounding DINO
+            - pipeline (boolean): True to read frames on a capture thread that keeps only the latest frame, and to write images and labels on background threads
+            - writer_threads (int): Number of writer threads in pipeline mode
+            - queue_size (int): Maximum number of samples waiting to be written in pipeline mode
+            - drop_policy (str): "block" or "drop"; what the annotator does when the write queue is full
+            - batch_size (int): Number of frames annotated together in one forward pass
+            - source (int or str or FrameSource or list): Camera index, video file or image directory to read, or a list of several to read at once with per-source quotas (see MultiSource); defaults to the selected camera
+            - headless (boolean): True to run without display windows
+            - checkpoint_every (int): Frames between progress checkpoints for video files and image directories
+            - gate (FrameGate): Pre-filter that skips frames nearly identical to already accepted ones before annotating
+            - shards (boolean): True to append images and labels to shard files in raw_dataset/shards instead of writing a file each (see ShardWriter)
+            - nms_iou (float): IoU above which overlapping boxes of a frame are merged into the higher scoring one; None keeps every box
         '''
+        # the object being captured is always the last class
+        label_number = len(self.run_state.candidate_labels)-1
+        img_folder = self.combined_folder+"/raw_dataset/images"
+        txt_folder = self.combined_folder+"/raw_dataset/labels"
+        os.makedirs(img_folder, exist_ok=True)
+        os.makedirs(txt_folder, exist_ok=True)
         # Capture using cv2
-        with open(self.json_file, 'r') as file:
-                data = json.load(file)
-        cam_index = data['camera_index']
-        vid = cv2.VideoCapture(cam_index)
-        try:
-            img_counter=0
-            while True:
-                ret, frame = vid.read()
-                cv2.imshow('Image Capture', frame)
-                key = cv2.waitKey(1) & 0xFF
-                if key == ord('q') or img_counter == self.image_threshold:
-                    break
-                
-                frame_bgr = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                results, xmin, ymin, xmax, ymax = self.owl_pred_live(frame_bgr, box_threshold, text_threshold)
+        source = open_source(source) if source is not None else CameraSource(self.run_state.camera_index, latest=pipeline)
+        checkpoint = CaptureCheckpoint(self.combined_folder+"/capture_checkpoint.json")
+        start, img_counter = checkpoint.load(source)
+        if start:
+            self.logger.info(f"Resuming {source.key} at frame {start} with {img_counter} images saved")
+        shard_writer = ShardWriter(self.logger, self.combined_folder+"/raw_dataset/shards", prefix="capture") if shards else None
+        writer = FrameWriter(self.logger, threads=writer_threads if pipeline else 0, queue_size=queue_size, drop_policy=drop_policy, shards=shard_writer)
+        annotator_stats = StageStats("annotator")
+        self.capture_stages = source.all_stats() + [annotator_stats, writer.stats]
+        if gate is not None:
+            self.capture_stages.insert(1, gate)
+        # position of the first frame not yet annotated, and where the last checkpoint was taken
+        next_position = saved_position = start
+        tracer = self.tracer
+        # images to take from each source when reading several at once, and images saved per source
+        quotas = source.quotas(self.image_threshold - img_counter) if isinstance(source, MultiSource) else None
+        if quotas is not None:
+            self.logger.info(f"Capturing from {len(quotas)} sources with quotas {quotas}")
+            # sources without a quota are not read at all
+            for tag, count in quotas.items():
+                if count == 0:
+                    source.finish(tag)
+        saved = {}
+
+        def annotate_batch(batch):
+            '''
+            Annotates a batch of (tag, frame) pairs and queues every frame with a detection for writing
+            '''
+            nonlocal img_counter
+            frames_rgb = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for _, frame in batch]
+            annotate_start = time.perf_counter()
+            with tracer.span("capture.annotate", frames=len(batch)):
+                results = self.owl_pred_batch(frames_rgb, box_threshold, text_threshold, tags=[tag for tag, _ in batch])
+            tracer.observe("capture.annotation_latency_ms", (time.perf_counter()-annotate_start)*1e3/len(batch))
+            tracer.count("capture.frames_annotated", len(batch))
+            annotator_stats.add(len(batch))
+            for (tag, frame), result in zip(batch, results):
                 # Store only if object is detected in frame
-                if xmin != None:
-                    img_folder = self.combined_folder+"/raw_dataset/images"
-                    txt_folder = self.combined_folder+"/raw_dataset/labels"
-                    if not os.path.exists(img_folder):
-                        os.makedirs(img_folder)
-                        os.makedirs(txt_folder)
-                    img_name = f"image_{img_counter}_{self.timestamp}.jpg"
-                    img_path = os.path.join(img_folder, img_name)
-                    ih, iw = frame.shape[:2]
-                    image_sh = cv2.rectangle(frame, (int(xmin),int(ymin)), (int(xmax),int(ymax)), (0,255,0), 2)
+                if len(result["boxes"]) == 0 or img_counter == self.image_threshold:
+                    continue
+                if quotas is not None and saved.get(tag, 0) >= quotas[tag]:
+                    continue
+                boxes, _, _ = filter_boxes(result["boxes"], result["scores"], frame.shape[:2], score_threshold=box_threshold, iou_threshold=nms_iou)
+                if len(boxes) == 0:
+                    continue
+                # file names carry the source's tag when capturing from several sources
+                img_name = f"image_{tag}_{img_counter}_{self.timestamp}.jpg" if tag else f"image_{img_counter}_{self.timestamp}.jpg"
+                img_path = os.path.join(img_folder, img_name)
+                image_sh = frame
+                for xmin, ymin, xmax, ymax in boxes.astype(np.int32).tolist():
+                    image_sh = cv2.rectangle(image_sh, (xmin, ymin), (xmax, ymax), (0,255,0), 2)
+                if not headless:
                     cv2.imshow("Detected OWL", image_sh)
-                    cv2.imwrite(img_path, image_sh)
-                    self.logger.info(f"{img_name} written!")
+                # Create labels.txt with one line per box
+                txt_path = os.path.join(txt_folder, os.path.splitext(img_name)[0] + ".txt")
+                data = format_labels(np.full(len(boxes), label_number), xyxy_to_xywhn(boxes, frame.shape[:2]))
+                if writer.submit(img_path, image_sh, txt_path, data):
                     img_counter += 1
-                    # Create labels.txt
-                    txt_path = os.path.join(txt_folder, os.path.splitext(img_name)[0] + ".txt")
-                    with open(self.json_file, 'r') as file:
-                        data = json.load(file)
-                    label_number = len(data['candidate_labels'])-1
-                    with open(txt_path, 'w') as file:
-                        xc = (xmin + xmax)/2
-                        yc = (ymin + ymax)/2
-                        w = xmax - xmin
-                        h = ymax - ymin
-                        data = f"{label_number} {xc/iw} {yc/ih} {w/iw} {h/ih}"
-                        file.write(data)
+                    tracer.count("capture.frames_kept")
+                    saved[tag] = saved.get(tag, 0) + 1
+                    if quotas is not None and saved[tag] >= quotas[tag]:
+                        source.finish(tag)
+
+        try:
+            batch = []
+            for position, tag, frame in source.frames_tagged(start):
+                if not headless:
+                    cv2.imshow(f'Image Capture {tag}' if tag else 'Image Capture', frame)
+                    key = cv2.waitKey(1) & 0xFF
+                    if key == ord('q'):
+                        break
+                if img_counter == self.image_threshold:
+                    break
+                tracer.count("capture.frames_read")
+                if quotas is not None and saved.get(tag, 0) >= quotas[tag]:
+                    continue
+                # skip frames that add nothing over the last accepted ones
+                if gate is not None and not gate.accept(frame):
+                    tracer.count("capture.frames_gated")
+                    continue
+
+                batch.append((tag, frame))
+                if len(batch) < batch_size:
+                    continue
+                annotate_batch(batch)
+                batch = []
+                next_position = position+1
+                if next_position - saved_position >= checkpoint_every:
+                    checkpoint.save(source, next_position, img_counter)
+                    saved_position = next_position
             
                 if img_counter == self.image_threshold:
                     break
-                    
+            else:
+                self.logger.info(f"Reached the end of {source.key}")
+                # the last frames of a finite source rarely fill a whole batch
+                if batch and img_counter < self.image_threshold:
+                    annotate_batch(batch)
+                    next_position = position+1
+                    batch = []
+
         finally:
-            vid.release()
-            cv2.destroyAllWindows()
+            source.close()
+            writer.close()
+            # frames read but not yet annotated are read again on resume
+            checkpoint.save(source, next_position, img_counter)
+            if not headless:
+                cv2.destroyAllWindows()
+            if saved and quotas is not None:
+                self.logger.info(f"Images saved per source: {saved}")
+            self.logger.info(f"Capture stats: {self.capture_stats()}")
+            self.annotation_report = self.annotator.report()
+            self.logger.info(f"Annotation with {self.annotator.name}: {self.annotation_report}")
+
+    def capture_stats(self):
+        '''
+        Reports each capture stage of the current or last capture_pred call; safe to call from another thread while capturing
+
+        Returns:
+            - dict: {stage name: {"count", "dropped", "per_sec", "queue_depth"}}
+        '''
+        return {stats.name: stats.snapshot() for stats in self.capture_stages}
 
-    def split_and_yaml(self):
+    def split_and_yaml(self, mode="list", ratio=0.7, seed=0, group=True, dataset="aug_dataset"):
         '''
         Splits and creates YAML file for training
+
+        Args:
+            - mode (str): "list" to write train.txt/val.txt image lists, "symlink" for folders of symlinks, "copy" to copy files with splitfolders
+            - ratio (float): Fraction of images that go to train
+            - seed (int): Seed for the split
+            - group (boolean): True to keep every augmented variant of a source image in the same split ("list" and "symlink" modes)
+            - dataset (str): Folder in combined_folder to split; "raw_dataset" when augmenting online during training
         '''
         upper_folder = self.combined_folder+"/split_dataset"
         if not os.path.exists(upper_folder):
             os.makedirs(upper_folder)
-        splitfolders.ratio(self.combined_folder+"/aug_dataset", output=upper_folder, ratio=(0.7, 0.3))
+        if mode == "copy":
+            import splitfolders
+            splitfolders.ratio(self.combined_folder+"/"+dataset, output=upper_folder, ratio=(ratio, 1-ratio), seed=seed)
+            train, val = f"{upper_folder}/train", f"{upper_folder}/val"
+        elif mode in ("list", "symlink"):
+            splitter = DatasetSplit(self.logger, self.combined_folder+"/"+dataset, upper_folder, ratio=ratio, seed=seed, group=group)
+            train, val = splitter.write_lists() if mode == "list" else splitter.write_symlinks()
+        else:
+            raise ValueError(f"Unknown split mode {mode}, expected 'list', 'symlink' or 'copy'")
         self.logger.info("Training and validation sets ready")
         # Create yaml file
-        f = open(self.json_file)
-        candidate_labels = json.load(f)['candidate_labels']
-        f.close()
+        candidate_labels = self.run_state.candidate_labels
         path = os.path.abspath(self.combined_folder)
         split_path = path.split("/{}".format(self.combined_folder))[0]
         yaml_content={
             'path': split_path,
-            'train': f"{upper_folder}/train",
-            'val': f"{upper_folder}/val",
+            'train': train,
+            'val': val,
             'names': {index: value for index,value in enumerate(candidate_labels)}
         }
         yaml_path = self.combined_folder+"/train.yaml"
@@ -157,55 +291,77 @@ class NewData:
                 yaml.dump(yaml_content, file)
         self.logger.info("YAML file created")
 
-    def train(self):
+    def train(self, warm_start=None, patience=None, export_onnx=False, onnx_int8=False, online_augment=False, aug_seed=None, workers=None):
         '''
-        Trains and returns new weight file for new dataset
+        Trains and returns new weight file for new dataset.
+        Training stops early once validation mAP50 reaches map_threshold, or after patience epochs without improvement.
+
+        Args:
+            - warm_start (str): Path to a previous best.pt to start from instead of yolov8n.pt; classes it already knows keep their head weights
+            - patience (int): Epochs without mAP improvement before stopping; None keeps the ultralytics default
+            - export_onnx (boolean): True to export the new weights to ONNX; live inference then runs through ONNX Runtime
+            - onnx_int8 (boolean): True to export a dynamically quantized INT8 model instead
+            - online_augment (boolean): True to run the Augment pipeline inside the training data loader with a new seed every epoch (see OnlineAugment)
+            - aug_seed (int): Base seed for online augmentation; a random one is picked and logged if None
+            - workers (int): Data loader worker processes; the ultralytics default if None
         '''
-        results = self.model_yolov8.train(data=f"{self.combined_folder}/train.yaml", epochs=self.epochs, device=self.device, project=self.combined_folder)
+        from ultralytics import YOLO
+        # training replaces the model's weights, so the base model is loaded fresh instead of from the registry
+        self.model_yolov8 = YOLO(warm_start or 'yolov8n.pt')
+        early_stop = MapEarlyStop(self.logger, self.map_threshold)
+        self.model_yolov8.add_callback("on_fit_epoch_end", early_stop)
+        if warm_start:
+            remapper = HeadRemapper(self.logger, self.model_yolov8, list(self.run_state.candidate_labels))
+            self.model_yolov8.add_callback("on_pretrain_routine_end", remapper)
+        train_args = {"patience": patience} if patience is not None else {}
+        if workers is not None:
+            train_args["workers"] = workers
+        if online_augment:
+            from .online_aug import OnlineAugment, online_trainer
+            online = OnlineAugment(self.combined_folder, self.run_state, seed=aug_seed)
+            self.model_yolov8.add_callback("on_train_epoch_start", online.set_epoch)
+            train_args["trainer"] = online_trainer(online)
+            self.logger.info(f"Augmenting online in the data loader, seed {online.seed}")
+        train_start = time.perf_counter()
+        results = self.model_yolov8.train(data=f"{self.combined_folder}/train.yaml", epochs=self.epochs, device=self.device, project=self.combined_folder, **train_args)
         rdict = results.__dict__
         new_weights_path = str(rdict["save_dir"])+"/weights/best.pt"
-        # Get MaP50 Score
-        map = rdict['box'].__dict__
-        map50 = map['all_ap'][0][0]
+        epochs_run = self.model_yolov8.trainer.epoch + 1
+        self.train_report = {"warm_start": warm_start, "epochs_run": epochs_run, "epochs_saved": self.epochs - epochs_run, "stopped_at_threshold": early_stop.stopped_epoch is not None, "online_augment": online_augment, "train_seconds": round(time.perf_counter()-train_start, 3)}
+        self.logger.info(f"Trained for {epochs_run}/{self.epochs} epochs, {self.epochs - epochs_run} saved")
+        # Get MaP50 Score, the mean over all classes that MapEarlyStop also stops on
+        map50 = float(rdict['box'].map50)
         # Put threshold on MaP50 score
         if map50>=self.map_threshold:
             new_weights_path = new_weights_path
             self.logger.info("Trained and stored the new weights")
+            if export_onnx or onnx_int8:
+                self.train_report["onnx"] = export_onnx_file(self.logger, new_weights_path, int8=onnx_int8)
         else:
             new_weights_path = None
             self.logger.error('Try with more images and training more epochs')
         # Start live inference
         if self.inference and new_weights_path!=None:
-            with open(self.json_file, 'r') as file:
-                data = json.load(file)
-            cam_index = data['camera_index']
-
-            vid = cv2.VideoCapture(cam_index)
-            new_yolov8 = YOLO(new_weights_path).to(self.device)
-            while True:
-                _, frame = vid.read()
-                cv2.imshow('Image Capture', frame)
-                results = new_yolov8(frame, conf=self.inference_threshold, device=self.device, stream=True)                
-
-                for r in results:
-                    boxes = r.boxes
-                    for box in boxes:
-                        # bounding box
-                        x1, y1, x2, y2 = box.xyxy[0]
-                        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2) # convert to int values
-                        # put box in cam
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0,255,0), 2)
-                        # confidence
-                        confidence = round(float(box.conf[0]) * 100, 2)
-                        # class name
-                        cls = int(box.cls[0])
-                        label = f"{data['candidate_labels'][cls]}: {confidence}%"
-                        cv2.putText(frame, label, [x1, y1], cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 2)
-
-                cv2.imshow('Inference', frame)
-
-                key = cv2.waitKey(1) & 0xFF
-                if key == 27: #ESC Key to exit
-                    break
+            self.live_inference(new_weights_path)
 
         return new_weights_path, map50
+
+    def live_inference(self, weights_path):
+        '''
+        Runs live inference with newly trained weights on live_source, or on the selected camera.
+        Training has already succeeded at this point, so a missing or unreadable source is logged instead of raised.
+
+        Args:
+            - weights_path (str): Path to the '.pt' weights file; its ONNX export is used if train made one
+        '''
+        source = self.live_source if self.live_source is not None else self.run_state.camera_index
+        if source is None:
+            self.logger.warning("No camera or video file to run live inference on, skipping it")
+            return
+        onnx_path = self.train_report.get("onnx")
+        backend = OnnxBackend(onnx_path) if onnx_path else YoloBackend(weights_path, device=self.device)
+        live = LiveInference(self.logger, backend, source=source, conf=self.inference_threshold, names=list(self.run_state.candidate_labels), show=self.show)
+        try:
+            live.run()
+        except IOError as e:
+            self.logger.error(f"Live inference stopped: {e}")
@@ -0,0 +1,95 @@
+import zlib
+import random
+import logging
+import multiprocessing
+
+import numpy as np
+# only imported by NewData.train, so ultralytics is loaded here like it is there
+from ultralytics.data import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer
+
+from .utils_aug import Augment
+
+
+class OnlineAugment:
+    '''
+    Applies the Augment pipeline to training samples as the data loader reads them, instead of writing number_aug copies of every image to disk.
+    Every sample is seeded from its file, the epoch and the base seed, so each epoch sees new variants and the result does not depend on which loader worker reads it.
+    The epoch lives in shared memory, so persistent loader worker processes see it change.
+
+    Args:
+        - combined_folder (str): Path to local folder holding the new data
+        - run_state (RunState): Shared in-memory state of the run's inputs.json
+        - seed (int): Base seed; a random one is picked if None
+    '''
+    def __init__(self, combined_folder, run_state, seed=None):
+        self.aug = Augment(logger=logging.getLogger("AutoTrain"), combined_folder=combined_folder, run_state=run_state)
+        self.seed = seed if seed is not None else random.randrange(2**31)
+        self.epoch = multiprocessing.RawValue("q", 0)
+
+    def set_epoch(self, trainer):
+        '''
+        Ultralytics on_train_epoch_start callback
+        '''
+        self.epoch.value = trainer.epoch
+
+    def sample_seed(self, im_file):
+        return zlib.crc32(f"{im_file}:{self.epoch.value}".encode()) ^ self.seed
+
+    def __call__(self, im_file, image, bboxes, cls):
+        '''
+        Augments one sample
+
+        Args:
+            - im_file (str): Path of the image, for its seed
+            - image (numpy.ndarray): BGR image
+            - bboxes (numpy.ndarray): Normalized x_center, y_center, width, height rows
+            - cls (numpy.ndarray): (n, 1) class indices
+        Returns:
+            - tuple: Augmented image, boxes and classes in the same formats
+        '''
+        # the ultralytics augmentations after this one draw from the same global generators, so their state is put back
+        state = random.getstate(), np.random.get_state()
+        self.aug.seed(self.sample_seed(im_file))
+        try:
+            image, boxes = self.aug.get_augmented_results(image, [list(box)+[int(c)] for box, c in zip(bboxes.tolist(), cls.ravel().tolist())])
+        finally:
+            random.setstate(state[0])
+            np.random.set_state(state[1])
+        bboxes = np.array([box[:4] for box in boxes], dtype=np.float32).reshape(-1, 4)
+        cls = np.array([box[-1] for box in boxes], dtype=np.float32).reshape(-1, 1)
+        return image, bboxes, cls
+
+
+class OnlineAugDataset(YOLODataset):
+    '''
+    YOLODataset that runs OnlineAugment on every image it loads, before the ultralytics augmentations (mosaic, HSV, flips) that follow
+    '''
+    online = None
+
+    def update_labels_info(self, label):
+        # boxes are still normalized here, so resizing by load_image does not matter
+        label["img"], label["bboxes"], label["cls"] = self.online(label["im_file"], label["img"], label["bboxes"], label["cls"])
+        return super().update_labels_info(label)
+
+
+class OnlineAugTrainer(DetectionTrainer):
+    '''
+    DetectionTrainer whose training dataset augments online; see online_trainer
+    '''
+    online = None
+
+    def build_dataset(self, img_path, mode="train", batch=None):
+        dataset = super().build_dataset(img_path, mode, batch)
+        if mode == "train":
+            # keeps everything build_yolo_dataset set up and only swaps in update_labels_info
+            dataset.__class__ = OnlineAugDataset
+            dataset.online = self.online
+        return dataset
+
+
+def online_trainer(online):
+    '''
+    Returns a trainer class for YOLO.train(trainer=...) that augments with the given OnlineAugment
+    '''
+    return type("OnlineAugTrainer", (OnlineAugTrainer,), {"online": online})
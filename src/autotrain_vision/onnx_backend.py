@@ -0,0 +1,201 @@
+import os
+import ast
+import sys
+import time
+import logging
+import argparse
+
+import cv2
+import numpy as np
+
+from .tracing import Tracer
+from .box_ops import nms, clip_boxes
+
+
+def export_onnx(logger, weights, imgsz=640, int8=False):
+    '''
+    Exports a YOLOv8 weights file to ONNX, optionally with dynamic INT8 quantization of the weights
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - weights (str): Path to a '.pt' weights file
+        - imgsz (int): Square input size of the exported model
+        - int8 (boolean): True to also write a dynamically quantized INT8 model and return its path
+    Returns:
+        - str: Path to the .onnx file (the INT8 one if int8)
+    '''
+    from ultralytics import YOLO
+    onnx_path = YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=False)
+    logger.info(f"Exported {weights} to {onnx_path}")
+    if not int8:
+        return onnx_path
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    int8_path = os.path.splitext(onnx_path)[0]+".int8.onnx"
+    quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QInt8)
+    logger.info(f"Quantized {onnx_path} to {int8_path} ({os.path.getsize(onnx_path)} -> {os.path.getsize(int8_path)} bytes)")
+    return int8_path
+
+
+class OnnxBackend:
+    '''
+    Runs an exported YOLOv8 ONNX model with ONNX Runtime, with letterboxing, decoding and NMS done in NumPy.
+    Returns detections like YoloBackend, so LiveInference can use either.
+
+    Args:
+        - model_path (str): Path to the .onnx file
+        - iou (float): IoU threshold for NMS
+        - threads (int): Intra-op threads for ONNX Runtime; its default if None
+        - providers (list): ONNX Runtime execution providers
+    '''
+    def __init__(self, model_path, iou=0.45, threads=None, providers=("CPUExecutionProvider",)):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=list(providers))
+        self.input_name = self.session.get_inputs()[0].name
+        self.imgsz = tuple(self.session.get_inputs()[0].shape[2:4])
+        self.iou = iou
+        # ultralytics stores the class names in the model metadata
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+        self._input = np.zeros((1, 3)+self.imgsz, dtype=np.float32)
+
+    def preprocess(self, frame):
+        '''
+        Letterboxes a BGR frame into the reused model input
+
+        Returns:
+            - tuple: Input tensor, scale and (left, top) padding
+        '''
+        height, width = frame.shape[:2]
+        target_h, target_w = self.imgsz
+        scale = min(target_h/height, target_w/width)
+        new_w, new_h = int(round(width*scale)), int(round(height*scale))
+        left, top = (target_w-new_w)//2, (target_h-new_h)//2
+        resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        self._input.fill(114/255)
+        # BGR HWC uint8 -> RGB CHW float in one strided assignment
+        self._input[0, :, top:top+new_h, left:left+new_w] = resized[:, :, ::-1].transpose(2, 0, 1)*(1/255)
+        return self._input, scale, (left, top)
+
+    def postprocess(self, output, conf, scale, pad, shape):
+        '''
+        Decodes a (1, 4+classes, anchors) YOLOv8 output into boxes in frame coordinates
+
+        Returns:
+            - tuple: xmin, ymin, xmax, ymax rows (numpy.ndarray), scores and class indices
+        '''
+        predictions = output[0].T
+        class_scores = predictions[:, 4:]
+        cls = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(cls)), cls]
+        mask = scores >= conf
+        predictions, scores, cls = predictions[mask], scores[mask], cls[mask]
+        xc, yc, w, h = predictions[:, 0], predictions[:, 1], predictions[:, 2], predictions[:, 3]
+        boxes = np.stack((xc-w/2, yc-h/2, xc+w/2, yc+h/2), axis=1)
+        # offset boxes per class so one NMS pass never suppresses across classes
+        keep = nms(boxes + cls[:, None]*4096.0, scores, self.iou)
+        boxes, scores, cls = boxes[keep], scores[keep], cls[keep]
+        boxes -= np.array([pad[0], pad[1], pad[0], pad[1]], dtype=boxes.dtype)
+        boxes /= scale
+        clip_boxes(boxes, shape)
+        return boxes, scores, cls.astype(np.int64)
+
+    def __call__(self, frame, conf):
+        '''
+        Args:
+            - frame (numpy.ndarray): BGR image
+            - conf (float): Minimum confidence score
+        Returns:
+            - tuple: xmin, ymin, xmax, ymax rows (numpy.ndarray), scores and class indices
+        '''
+        tensor, scale, pad = self.preprocess(frame)
+        output = self.session.run(None, {self.input_name: tensor})[0]
+        return self.postprocess(output, conf, scale, pad, frame.shape[:2])
+
+
+def compare_latency(logger, backends, frames, conf=0.4, warmup=3):
+    '''
+    Times several backends on the same frames
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - backends (dict): {name: backend}, e.g. {"torch": YoloBackend(...), "onnx": OnnxBackend(...)}
+        - frames (list): BGR frames to run every backend on
+        - conf (float): Confidence threshold
+        - warmup (int): Untimed runs per backend first
+    Returns:
+        - dict: {name: latency histogram in ms plus the mean number of detections}
+    '''
+    results = {}
+    for name, backend in backends.items():
+        tracer = Tracer()
+        for frame in frames[:warmup]:
+            backend(frame, conf)
+        detections = 0
+        for frame in frames:
+            start = time.perf_counter()
+            boxes, _, _ = backend(frame, conf)
+            tracer.observe("latency_ms", (time.perf_counter()-start)*1e3)
+            detections += len(boxes)
+        results[name] = {**tracer.summary()["histograms"]["latency_ms"], "detections_per_frame": round(detections/len(frames), 3)}
+        logger.info(f"{name}: {results[name]}")
+    return results
+
+
+def read_frames(source, limit):
+    '''
+    Reads up to limit frames from a video file or an image directory
+    '''
+    if os.path.isdir(source):
+        names = sorted(os.listdir(source))[:limit]
+        return [frame for frame in (cv2.imread(os.path.join(source, name)) for name in names) if frame is not None]
+    capture = cv2.VideoCapture(source)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+
+def main(argv=None):
+    '''
+    Command line entry point:
+        python -m autotrain_vision.onnx_backend export <best.pt> [--int8]
+        python -m autotrain_vision.onnx_backend compare <best.pt> <best.onnx> <video or image dir>
+    '''
+    parser = argparse.ArgumentParser(prog="python -m autotrain_vision.onnx_backend", description="Export YOLOv8 weights to ONNX and compare CPU latency")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="export a .pt weights file to ONNX")
+    export_parser.add_argument("weights")
+    export_parser.add_argument("--imgsz", type=int, default=640)
+    export_parser.add_argument("--int8", action="store_true", help="also write a dynamically quantized INT8 model")
+    compare_parser = commands.add_parser("compare", help="compare PyTorch and ONNX Runtime latency on the same frames")
+    compare_parser.add_argument("weights")
+    compare_parser.add_argument("onnx", nargs="+", help="one or more .onnx files")
+    compare_parser.add_argument("--source", required=True, help="video file or image directory")
+    compare_parser.add_argument("--frames", type=int, default=50)
+    compare_parser.add_argument("--conf", type=float, default=0.4)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logger = logging.getLogger("AutoTrain")
+    if args.command == "export":
+        export_onnx(logger, args.weights, imgsz=args.imgsz, int8=args.int8)
+        return 0
+    from .live_inference import YoloBackend
+    frames = read_frames(args.source, args.frames)
+    if not frames:
+        parser.error(f"No frames read from {args.source}")
+    backends = {"torch": YoloBackend(args.weights, device="cpu")}
+    backends.update({os.path.basename(path): OnnxBackend(path) for path in args.onnx})
+    compare_latency(logger, backends, frames, conf=args.conf)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,42 @@
 import os
-import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import cv2
 import yaml
-import json
+import numpy as np
+
+from .dataset_stage import DatasetStage
+from .label_store import LabelStore
+
+
+def draw_label_boxes(image_path, boxes):
+    '''
+    Draws YOLO boxes on an image and rewrites it. The image is replaced through a temporary file, so a hardlinked source file is never modified.
+
+    Args:
+        - image_path (str): Path to the image
+        - boxes (numpy.ndarray): Normalized x_center, y_center, width, height rows
+    Returns:
+        - bool: True if the image was rewritten with boxes
+    '''
+    if len(boxes) == 0:
+        return False
+    image_cv = cv2.imread(image_path)
+    if image_cv is None:
+        return False
+    ih,iw = image_cv.shape[:2]
+    # normalized xywh to pixel xmin, ymin, xmax, ymax for every box at once
+    scaled = boxes * np.array([iw, ih, iw, ih], dtype=np.float32)
+    corners = np.concatenate([scaled[:, :2] - scaled[:, 2:]/2, scaled[:, :2] + scaled[:, 2:]/2], axis=1).astype(int)
+    for xmin, ymin, xmax, ymax in corners.tolist():
+        cv2.rectangle(image_cv, (xmin,ymin), (xmax,ymax), (0,255,0), 2)
+    folder, name = os.path.split(image_path)
+    stem, ext = os.path.splitext(name)
+    tmp_path = os.path.join(folder, f".{stem}.drawing{ext}")
+    cv2.imwrite(tmp_path, image_cv)
+    os.replace(tmp_path, image_path)
+    return True
 
 
 class RoboflowBB:
@@ -13,57 +47,55 @@ class RoboflowBB:
         - logger (object instance): Logger instance for adding logs
         - prev_folder (str): Path to local previous folder containing dataset in images and labels folder
         - combined_folder (str): Path to local folder to store the new data
-        - json_file (str): Path to inputs.json file used for training new data
+        - run_state (RunState): Shared in-memory state of the run's inputs.json
         - abs_yaml_file (str): Absolute path to the YAML file
+        - workers (int): Number of threads for importing files and processes for drawing boxes; defaults to the CPU count
+        - blob_store (BlobStore): Shared store to import files through, instead of linking or copying them directly
     '''
-    def __init__(self, logger, prev_folder, combined_folder, json_file, abs_yaml_file):
+    def __init__(self, logger, prev_folder, combined_folder, run_state, abs_yaml_file, workers=None, blob_store=None):
         self.logger = logger
         self.prev_folder = prev_folder
         self.combined_folder = combined_folder+"/raw_dataset"
-        self.json_file = json_file
+        self.run_state = run_state
         self.abs_yaml_file = abs_yaml_file
+        self.workers = workers or os.cpu_count() or 1
+        self.blob_store = blob_store
 
     def make_copy_folder(self):
         '''
-        Copies files from Roboflow folder(prev_folder) to the combined_folder
+        Links or copies files from Roboflow folder(prev_folder) to the combined_folder
+
+        Returns:
+            - dict: Number of files per method used, see DatasetStage.stage and BlobStore.import_folder
         '''
-        for item in os.listdir(f"{self.prev_folder}/images"):
-            source_path = os.path.join(f"{self.prev_folder}/images", item)
-            destination_path = os.path.join(f"{self.combined_folder}/images", item)
-            shutil.copy(source_path,destination_path)
-            self.logger.info(f"Copied images to {self.combined_folder}")
-        for item in os.listdir(f"{self.prev_folder}/labels"):
-            source_path = os.path.join(f"{self.prev_folder}/labels", item)
-            destination_path = os.path.join(f"{self.combined_folder}/labels", item)
-            shutil.copy(source_path,destination_path)
-            self.logger.info(f"Copied labels to {self.combined_folder}")
+        if self.blob_store is not None:
+            return self.blob_store.import_folder(self.prev_folder, self.combined_folder)
+        stage = DatasetStage(logger=self.logger, src_folder=self.prev_folder, dst_folder=self.combined_folder)
+        return stage.stage(workers=self.workers)
 
     def drawing_bb(self):
         '''
         Draws Bounding boxes on the roboflow images
         '''
+        # index the labels once instead of listing the folder for every image
+        labels = LabelStore(self.logger, f"{self.combined_folder}/labels").load()
+        tasks = []
         for image in os.listdir(f"{self.combined_folder}/images"):
-            image_path = f"{self.combined_folder}/images/{image}"
-            image_cv = cv2.imread(image_path)
-            ih,iw = image_cv.shape[:2]
             initials = os.path.splitext(image)[0]
-            label = f"{initials}.txt"
-            if label in os.listdir(f"{self.combined_folder}/labels"):
-                with open(f"{self.combined_folder}/labels/{label}", "r") as fl:
-                    bb_list = []
-                    label_content = fl.read()
-                    label_content = label_content.split("\n")
-                    for labels in label_content:
-                        if len(labels)!=0:
-                            xcn, ycn, wn, hn = [float(i) for i in labels.split(" ")[1:]]
-                            xc,yc,w,h = xcn*iw, ycn*ih, wn*iw, hn*ih
-                            xmax, xmin, ymax, ymin = int((2*xc+w)/2), int((2*xc-w)/2), int((2*yc+h)/2), int((2*yc-h)/2)
-                            bb_ind_list = [xmin, ymin, xmax, ymax]
-                        bb_list.append(bb_ind_list)
-                    for bb in bb_list:
-                        image_sh = cv2.rectangle(image_cv, (bb[0],bb[1]), (bb[2],bb[3]), (0,255,0), 2)
-                    
-                    cv2.imwrite(image_path,image_sh)
+            if initials in labels:
+                tasks.append((f"{self.combined_folder}/images/{image}", labels.get(initials)[1]))
+        if not tasks:
+            return
+        start = time.perf_counter()
+        drawn = 0
+        report_every = max(1, len(tasks)//4)
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            results = pool.map(draw_label_boxes, *zip(*tasks), chunksize=max(1, len(tasks)//(8*self.workers)))
+            for done, result in enumerate(results, start=1):
+                drawn += result
+                if done % report_every == 0 and done < len(tasks):
+                    self.logger.info(f"Drew boxes on {done}/{len(tasks)} images")
+        self.logger.info(f"Drew boxes on {drawn}/{len(tasks)} images in {time.perf_counter()-start:.1f}s")
     
     def update_json_from_yaml(self):
         '''
@@ -73,17 +105,9 @@ class RoboflowBB:
             yaml_data = yaml.safe_load(file)
         names_list = yaml_data.get('names', [])
         if type(names_list) is dict:
-            with open(self.json_file, 'r') as file:
-                data = json.load(file)
-            data['candidate_labels']=list(names_list.values())
-            with open(self.json_file, 'w') as file:
-                json.dump(data, file, indent=4)
+            self.run_state.set_labels(names_list.values())
         else:
-            with open(self.json_file, 'r') as file:
-                data = json.load(file)
-            data['candidate_labels']=names_list
-            with open(self.json_file, 'w') as file:
-                json.dump(data, file, indent=4)
+            self.run_state.set_labels(names_list)
 
     def run(self):
         '''
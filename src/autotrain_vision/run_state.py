@@ -0,0 +1,135 @@
+import os
+import json
+import tempfile
+
+
+class RunState:
+    '''
+    In-memory copy of a run's inputs.json (candidate_labels and camera_index) shared by every stage of the pipeline.
+    The file is read once, and rewritten atomically only when a setter actually changes the state.
+
+    Args:
+        - json_file (str): Path to inputs.json file used for training new data
+    '''
+    def __init__(self, json_file):
+        self.json_file = json_file
+        self.data = {"candidate_labels": []}
+        self._label_index = {}
+        # a missing file is written on the first save
+        self.dirty = not os.path.exists(self.json_file)
+        if not self.dirty:
+            self.load()
+
+    def load(self):
+        '''
+        Reloads the state from json_file, discarding unsaved changes
+        '''
+        with open(self.json_file, 'r') as file:
+            self.data = json.load(file)
+        self.data.setdefault("candidate_labels", [])
+        self._reindex()
+        self.dirty = False
+
+    def save(self):
+        '''
+        Atomically writes the state to json_file if it changed since the last load or save
+        '''
+        if not self.dirty:
+            return
+        folder = os.path.dirname(os.path.abspath(self.json_file))
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".inputs_", suffix=".json")
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump(self.data, file, indent=4)
+            os.replace(tmp_path, self.json_file)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.dirty = False
+
+    def _reindex(self):
+        self._label_index = {}
+        for index, label in enumerate(self.data["candidate_labels"]):
+            # keep the first index for duplicate names, matching list.index
+            self._label_index.setdefault(label, index)
+
+    def _update(self, key, value):
+        if key in self.data and self.data[key] == value:
+            return
+        self.data[key] = value
+        if key == "candidate_labels":
+            self._reindex()
+        self.dirty = True
+        self.save()
+
+    @property
+    def candidate_labels(self):
+        '''
+        Tuple of class names, in class index order
+        '''
+        return tuple(self.data["candidate_labels"])
+
+    @property
+    def camera_index(self):
+        '''
+        Selected camera index, or None if no camera was selected
+        '''
+        return self.data.get("camera_index")
+
+    @property
+    def camera_indices(self):
+        '''
+        Selected camera indices for multi-camera capture; the single selected camera if only one was selected
+        '''
+        if "camera_indices" in self.data:
+            return tuple(self.data["camera_indices"])
+        return (self.camera_index,) if self.camera_index is not None else ()
+
+    def label_index(self, label_name):
+        '''
+        Returns the class index for a class name
+
+        Args:
+            - label_name (str): Class name
+        Returns:
+            - int: Index of the class in candidate_labels
+        '''
+        try:
+            return self._label_index[label_name]
+        except KeyError:
+            raise ValueError(f"{label_name} is not in candidate_labels") from None
+
+    def set_labels(self, labels):
+        '''
+        Replaces candidate_labels
+
+        Args:
+            - labels (list): Class names, in class index order
+        '''
+        self._update("candidate_labels", list(labels))
+
+    def add_label(self, label_name):
+        '''
+        Appends a class name to candidate_labels
+        '''
+        self.set_labels(self.data["candidate_labels"] + [label_name])
+
+    def replace_last_label(self, label_name):
+        '''
+        Replaces the last class name in candidate_labels
+        '''
+        self.set_labels(self.data["candidate_labels"][:-1] + [label_name])
+
+    def set_camera_index(self, camera_index):
+        '''
+        Stores the selected camera index
+        '''
+        self._update("camera_index", camera_index)
+
+    def set_camera_indices(self, camera_indices):
+        '''
+        Stores the cameras selected for multi-camera capture; the first one also becomes camera_index
+        '''
+        self._update("camera_indices", list(camera_indices))
+        self.set_camera_index(self.data["camera_indices"][0])
@@ -0,0 +1,300 @@
+import os
+import sys
+import mmap
+import glob
+import shutil
+import logging
+import argparse
+import threading
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp")
+
+
+class ShardWriter:
+    '''
+    Appends encoded images and their YOLO label text to shard files, so a dataset is a handful of large files instead of two small files per image.
+    A shard holds records back to back; the writer's index file gets one line per record (name, shard, offset, image size, label size),
+    appended only after the record's bytes are flushed, so a crash never leaves an index entry pointing at missing data.
+    Writers with different prefixes can append to the same folder at the same time, e.g. one per worker process.
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - folder (str): Shard folder
+        - prefix (str): Name prefix of this writer's shard and index files
+        - shard_size (int): Bytes after which a new shard file is started
+        - jpeg_quality (int): JPEG quality used by add_image
+    '''
+    def __init__(self, logger, folder, prefix="shard", shard_size=256*2**20, jpeg_quality=95):
+        self.logger = logger
+        self.folder = folder
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.jpeg_quality = jpeg_quality
+        self.index_path = os.path.join(folder, f"{prefix}.index")
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        self.shard_number, end = self._resume()
+        self._open_shard(end)
+        self.index = open(self.index_path, 'a')
+        self.records = 0
+
+    def _resume(self):
+        '''
+        Finds the shard to continue and where its last indexed record ends; bytes past it belong to an unfinished record
+        '''
+        ends = {}
+        if os.path.exists(self.index_path):
+            for _, shard, offset, image_size, label_size in read_index(self.index_path):
+                number = int(shard[len(self.prefix)+1:-len(".bin")])
+                ends[number] = max(ends.get(number, 0), offset+image_size+label_size)
+        if not ends:
+            return 0, 0
+        shard_number = max(ends)
+        return shard_number, ends[shard_number]
+
+    def _shard_name(self):
+        return f"{self.prefix}-{self.shard_number:05d}.bin"
+
+    def _open_shard(self, end=0):
+        path = os.path.join(self.folder, self._shard_name())
+        self.shard = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+        self.shard.truncate(end)
+        self.shard.seek(end)
+
+    def add(self, name, image_bytes, label_text=""):
+        '''
+        Appends one encoded image and its label text
+
+        Args:
+            - name (str): Image file name, e.g. image_3_20250101120000.jpg; a later record with the same name replaces it for readers
+            - image_bytes (bytes): Encoded image
+            - label_text (str): Content of the YOLO label file
+        '''
+        label_bytes = label_text.encode()
+        with self._lock:
+            if self.shard.tell() and self.shard.tell()+len(image_bytes)+len(label_bytes) > self.shard_size:
+                self.shard.close()
+                self.shard_number += 1
+                self._open_shard()
+            offset = self.shard.tell()
+            self.shard.write(image_bytes)
+            self.shard.write(label_bytes)
+            self.shard.flush()
+            self.index.write(f"{name}\t{self._shard_name()}\t{offset}\t{len(image_bytes)}\t{len(label_bytes)}\n")
+            self.index.flush()
+            self.records += 1
+
+    def add_image(self, name, image, label_text=""):
+        '''
+        Encodes an image as JPEG and appends it with its label text
+        '''
+        ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError(f"Could not encode {name}")
+        self.add(name, encoded.tobytes(), label_text)
+
+    def close(self):
+        with self._lock:
+            self.shard.close()
+            self.index.close()
+
+
+def read_index(index_path):
+    '''
+    Reads the complete lines of an index file
+
+    Returns:
+        - list: (name, shard file, offset, image size, label size) tuples
+    '''
+    entries = []
+    with open(index_path, 'r') as file:
+        for line in file:
+            # a line without its newline was cut off by a crash
+            if not line.endswith("\n"):
+                break
+            name, shard, offset, image_size, label_size = line.rstrip("\n").split("\t")
+            entries.append((name, shard, int(offset), int(image_size), int(label_size)))
+    return entries
+
+
+class ShardReader:
+    '''
+    Random access to a shard folder through memory-mapped shard files.
+    Every index file in the folder is read once; when a name occurs more than once the record written last wins.
+
+    Args:
+        - folder (str): Shard folder written by ShardWriter
+    '''
+    def __init__(self, folder):
+        self.folder = folder
+        self.records = {}
+        self._maps = {}
+        for index_path in sorted(glob.glob(os.path.join(folder, "*.index"))):
+            for name, shard, offset, image_size, label_size in read_index(index_path):
+                self.records[name] = (shard, offset, image_size, label_size)
+        # the record's bytes must lie inside the shard; anything else was not written completely
+        sizes = {shard: os.path.getsize(os.path.join(folder, shard)) for shard in {record[0] for record in self.records.values()}}
+        self.records = {name: record for name, record in self.records.items() if record[1]+record[2]+record[3] <= sizes[record[0]]}
+        self.names = sorted(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, name):
+        return name in self.records
+
+    def _map(self, shard):
+        if shard not in self._maps:
+            with open(os.path.join(self.folder, shard), 'rb') as file:
+                self._maps[shard] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._maps[shard]
+
+    def read(self, name):
+        '''
+        Returns:
+            - tuple: Encoded image (bytes) and label text
+        '''
+        shard, offset, image_size, label_size = self.records[name]
+        mapped = self._map(shard)
+        return mapped[offset:offset+image_size], mapped[offset+image_size:offset+image_size+label_size].decode()
+
+    def image(self, name, flags=cv2.IMREAD_COLOR):
+        '''
+        Decodes one image straight from the mapped shard, without copying its bytes first
+        '''
+        shard, offset, image_size, _ = self.records[name]
+        return cv2.imdecode(np.frombuffer(self._map(shard), dtype=np.uint8, count=image_size, offset=offset), flags)
+
+    def label_text(self, name):
+        shard, offset, image_size, label_size = self.records[name]
+        return self._map(shard)[offset+image_size:offset+image_size+label_size].decode()
+
+    def shard_bytes(self):
+        '''
+        Returns:
+            - int: Total size of the shard files
+        '''
+        return sum(os.path.getsize(path) for path in glob.glob(os.path.join(self.folder, "*.bin")))
+
+    def close(self):
+        for mapped in self._maps.values():
+            mapped.close()
+        self._maps = {}
+
+
+def pack_folder(logger, dataset_folder, shard_folder, prefix="pack", shard_size=256*2**20, skip_existing=True):
+    '''
+    Packs a YOLO folder (images/ and labels/) into shards, keeping the encoded image bytes as they are
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - dataset_folder (str): Folder with images and labels sub folders
+        - shard_folder (str): Shard folder to append to
+        - prefix (str): Prefix of the shard files written
+        - shard_size (int): Bytes after which a new shard file is started
+        - skip_existing (boolean): True to leave out images already in shard_folder
+    Returns:
+        - int: Number of images packed
+    '''
+    images_folder = os.path.join(dataset_folder, "images")
+    labels_folder = os.path.join(dataset_folder, "labels")
+    existing = set(ShardReader(shard_folder).records) if skip_existing and os.path.isdir(shard_folder) else set()
+    names = sorted(name for name in os.listdir(images_folder) if name.lower().endswith(IMAGE_EXTENSIONS) and name not in existing)
+    if not names:
+        return 0
+    writer = ShardWriter(logger, shard_folder, prefix=prefix, shard_size=shard_size)
+    try:
+        for name in names:
+            with open(os.path.join(images_folder, name), 'rb') as file:
+                image_bytes = file.read()
+            label_path = os.path.join(labels_folder, os.path.splitext(name)[0]+".txt")
+            label_text = ""
+            if os.path.exists(label_path):
+                with open(label_path, 'r') as file:
+                    label_text = file.read()
+            writer.add(name, image_bytes, label_text)
+    finally:
+        writer.close()
+    logger.info(f"Packed {len(names)} images from {dataset_folder} into {shard_folder}")
+    return len(names)
+
+
+def export_folder(logger, shard_folders, dataset_folder):
+    '''
+    Writes the records of one or more shard folders out as a YOLO folder (images/ and labels/) for training
+
+    Args:
+        - logger (object instance): Logger instance for adding logs
+        - shard_folders (list or str): Shard folders to export; later ones win on equal names
+        - dataset_folder (str): Folder to create the images and labels sub folders in
+    Returns:
+        - int: Number of images exported
+    '''
+    if isinstance(shard_folders, str):
+        shard_folders = [shard_folders]
+    images_folder = os.path.join(dataset_folder, "images")
+    labels_folder = os.path.join(dataset_folder, "labels")
+    os.makedirs(images_folder, exist_ok=True)
+    os.makedirs(labels_folder, exist_ok=True)
+    exported = 0
+    for shard_folder in shard_folders:
+        reader = ShardReader(shard_folder)
+        try:
+            for name in reader.names:
+                image_bytes, label_text = reader.read(name)
+                with open(os.path.join(images_folder, name), 'wb') as file:
+                    file.write(image_bytes)
+                with open(os.path.join(labels_folder, os.path.splitext(name)[0]+".txt"), 'w') as file:
+                    file.write(label_text)
+                exported += 1
+        finally:
+            reader.close()
+    logger.info(f"Exported {exported} images from {len(shard_folders)} shard folder(s) to {dataset_folder}")
+    return exported
+
+
+def remove_shards(folder):
+    '''
+    Deletes a shard folder, e.g. derived data that is rebuilt from scratch
+    '''
+    if os.path.isdir(folder):
+        shutil.rmtree(folder)
+
+
+def main(argv=None):
+    '''
+    Command line entry point:
+        python -m autotrain_vision.shard_store pack <dataset_folder> <shard_folder>
+        python -m autotrain_vision.shard_store export <shard_folder>... --to <dataset_folder>
+        python -m autotrain_vision.shard_store info <shard_folder>
+    '''
+    parser = argparse.ArgumentParser(prog="python -m autotrain_vision.shard_store", description="Pack YOLO folders into shard files and export them back")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pack_parser = commands.add_parser("pack", help="pack a folder with images and labels sub folders into shards")
+    pack_parser.add_argument("dataset_folder")
+    pack_parser.add_argument("shard_folder")
+    pack_parser.add_argument("--shard-size", type=int, default=256, help="shard size in MiB")
+    export_parser = commands.add_parser("export", help="export shards to a folder with images and labels sub folders")
+    export_parser.add_argument("shard_folders", nargs="+")
+    export_parser.add_argument("--to", required=True, dest="dataset_folder")
+    info_parser = commands.add_parser("info", help="print the number of images and bytes in a shard folder")
+    info_parser.add_argument("shard_folder")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logger = logging.getLogger("AutoTrain")
+    if args.command == "pack":
+        pack_folder(logger, args.dataset_folder, args.shard_folder, shard_size=args.shard_size*2**20)
+    elif args.command == "export":
+        export_folder(logger, args.shard_folders, args.dataset_folder)
+    else:
+        reader = ShardReader(args.shard_folder)
+        logger.info(f"{args.shard_folder}: {len(reader)} images, {reader.shard_bytes()} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+
+
+class _NullSpan:
+    '''
+    Span returned by a disabled Tracer; entering and leaving it does nothing
+    '''
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer._record(self.name, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+
+class _Histogram:
+    '''
+    Count, sum and max of every value observed, plus a window of the most recent values for percentiles
+    '''
+    __slots__ = ("count", "total", "max", "recent")
+
+    def __init__(self, max_samples):
+        self.count = 0
+        self.total = 0.0
+        self.max = None
+        self.recent = deque(maxlen=max_samples)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.max = value if self.max is None or value > self.max else self.max
+        self.recent.append(value)
+
+
+class Tracer:
+    '''
+    Collects timing spans, counters and histograms for one run, and exports them as a JSON summary and a Chrome trace.
+    A disabled tracer returns a shared no-op span and ignores counters and histograms, so instrumented code costs one method call when tracing is off.
+
+    Args:
+        - enabled (boolean): False to record nothing
+        - max_events (int): Maximum number of individual spans kept for the Chrome trace; totals in the summary keep counting past it
+        - max_samples (int): Most recent values kept per histogram for its percentiles; count, mean and max cover every value, so memory stays bounded however long the tracer runs
+    '''
+    def __init__(self, enabled=True, max_events=200000, max_samples=10000):
+        self.enabled = enabled
+        self.max_events = max_events
+        self.max_samples = max_samples
+        self.events = []
+        self.spans = {}
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def span(self, name, **args):
+        '''
+        Returns a context manager that times the code inside it
+
+        Args:
+            - name (str): Name of the span, e.g. "capture" or "augment.image"
+            - args: Values attached to the span in the Chrome trace
+        '''
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def _record(self, name, start, end, args):
+        duration = end - start
+        with self._lock:
+            total = self.spans.get(name)
+            if total is None:
+                self.spans[name] = [1, duration, duration]
+            else:
+                total[0] += 1
+                total[1] += duration
+                total[2] = max(total[2], duration)
+            if len(self.events) < self.max_events:
+                self.events.append((name, start, duration, threading.get_ident(), args))
+
+    def count(self, name, n=1):
+        '''
+        Adds n to a counter
+        '''
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, value):
+        '''
+        Adds a value to a histogram, e.g. a latency in ms
+        '''
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = _Histogram(self.max_samples)
+            histogram.add(value)
+
+    def summary(self):
+        '''
+        Returns:
+            - dict: Per span count, total/mean/max ms; counters; per histogram count, mean and max of every value, and p50 and p95 of the last max_samples values
+        '''
+        with self._lock:
+            spans = {name: {"count": c, "total_ms": round(t/1e6, 3), "mean_ms": round(t/c/1e6, 3), "max_ms": round(m/1e6, 3)} for name, (c, t, m) in self.spans.items()}
+            histograms = {}
+            for name, histogram in self.histograms.items():
+                ordered = sorted(histogram.recent)
+                histograms[name] = {
+                    "count": histogram.count,
+                    "mean": round(histogram.total/histogram.count, 3),
+                    "p50": round(ordered[len(ordered)//2], 3),
+                    "p95": round(ordered[min(len(ordered)-1, int(len(ordered)*0.95))], 3),
+                    "max": round(histogram.max, 3),
+                }
+            return {"spans": spans, "counters": dict(self.counters), "histograms": histograms}
+
+    def chrome_trace(self):
+        '''
+        Returns:
+            - dict: Recorded spans in Chrome trace event format, viewable in chrome://tracing or Perfetto
+        '''
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+        origin = min((event[1] for event in events), default=0)
+        return {
+            "traceEvents": [{"name": name, "ph": "X", "ts": (start-origin)/1e3, "dur": duration/1e3, "pid": pid, "tid": tid, "args": args} for name, start, duration, tid, args in events],
+            "displayTimeUnit": "ms",
+        }
+
+    def export(self, folder):
+        '''
+        Writes trace_summary.json and trace.json (Chrome trace) into folder; does nothing when disabled
+
+        Args:
+            - folder (str): Run folder to write into
+        Returns:
+            - tuple: Paths to the summary and the Chrome trace, or None when disabled
+        '''
+        if not self.enabled:
+            return None
+        os.makedirs(folder, exist_ok=True)
+        paths = (os.path.join(folder, "trace_summary.json"), os.path.join(folder, "trace.json"))
+        for path, content in zip(paths, (self.summary(), self.chrome_trace())):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'w') as file:
+                json.dump(content, file, indent=1)
+            os.replace(tmp_path, path)
+        return paths
+
+
+# shared disabled tracer, the default wherever no tracer is passed
+NULL_TRACER = Tracer(enabled=False)
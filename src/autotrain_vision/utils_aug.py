@@ -1,8 +1,10 @@
-import albumentations as A
 import cv2
 import os
-import shutil
-import json
+import random
+import numpy as np
+
+from .dataset_stage import DatasetStage
+from .label_store import LabelStore, format_labels
 
 
 class Augment():
@@ -12,12 +14,18 @@ class Augment():
     Args:
         - logger (object instance): Logger instance for adding logs
         - combined_folder (str): Path to local folder to store the new data
-        - json_file (str): Path to inputs.json file used for training new data
+        - run_state (RunState): Shared in-memory state of the run's inputs.json
     '''
-    def __init__(self, logger, combined_folder, json_file):
+    def __init__(self, logger, combined_folder, run_state):
         self.logger = logger
         self.combined_folder = combined_folder
-        self.json_file = json_file
+        self.run_state = run_state
+        self.transform = None
+        # LabelStore of raw_dataset/labels; get_inp_data reparses label files if it is None
+        self.label_store = None
+        # ShardReader of raw_dataset/shards and ShardWriter into aug_dataset/shards when augmenting shards instead of folders
+        self.shard_reader = None
+        self.shard_writer = None
 
     def is_image_by_extension(self, file_name):
         '''
@@ -46,11 +54,14 @@ class Augment():
         '''
         file_name = os.path.splitext(img_file)[0]
         aug_file_name = f"{file_name}_aug_out"
+        if self.shard_reader is not None:
+            image = self.shard_reader.image(img_file)
+            return image, self.get_bboxes_from_text(self.shard_reader.label_text(img_file), self.run_state.candidate_labels), aug_file_name
         image = cv2.imread(os.path.join(self.combined_folder+"/raw_dataset/images", img_file))
+        if self.label_store is not None:
+            return image, self.label_store.album_bboxes(file_name, self.run_state.candidate_labels), aug_file_name
         lab_pth = os.path.join(self.combined_folder+"/raw_dataset/labels", f"{file_name}.txt")
-        with open(self.json_file, 'r') as file:
-            data = json.load(file)
-        gt_bboxes = self.get_bboxes_list(lab_pth, data["candidate_labels"])
+        gt_bboxes = self.get_bboxes_list(lab_pth, self.run_state.candidate_labels)
         return image, gt_bboxes, aug_file_name
 
     def get_album_bb_list(self, yolo_bbox, class_names):
@@ -99,7 +110,12 @@ class Augment():
             - list: A list of lists, each containing [x_center, y_center, width, height, class_name].
         '''
         yolo_str_labels = open(inp_lab_pth, "r").read()
+        return self.get_bboxes_from_text(yolo_str_labels, classes)
 
+    def get_bboxes_from_text(self, yolo_str_labels, classes):
+        '''
+        Returns bounding box information from the content of a YOLO format labels file, see get_bboxes_list
+        '''
         if not yolo_str_labels:
             self.logger.info("No object")
             return []
@@ -108,18 +124,17 @@ class Augment():
         album_bb_lists = self.get_album_bb_lists("\n".join(lines), classes) if len(lines) > 1 else [self.get_album_bb_list("\n".join(lines), classes)]
         return album_bb_lists
 
-    def get_augmented_results(self, image, bboxes):
+    def build_transform(self):
         '''
-        Apply data augmentation to an input image and bounding boxes.
+        Builds the augmentation pipeline.
 
-        Args:
-            - image (numpy.ndarray): Input image.
-            - bboxes (list): List of bounding boxes in YOLO format [x_center, y_center, width, height, class_name].
         Returns:
-            - tuple: A tuple containing the augmented image and the transformed bounding boxes.
+            - albumentations.Compose: Pipeline taking an image and YOLO format bounding boxes
         '''
+        # imported here so importing the package does not load albumentations
+        import albumentations as A
         # Define the augmentations
-        transform = A.Compose([
+        return A.Compose([
             A.HorizontalFlip(p=0.3),
             A.VerticalFlip(p=0.5),
             A.RandomBrightnessContrast(brightness_limit=0.2, contrast_limit=0),
@@ -127,54 +142,62 @@ class Augment():
             A.Blur(blur_limit=(3, 7), p=0.5),
         ], bbox_params=A.BboxParams(format='yolo', clip=True))
 
+    def seed(self, seed):
+        '''
+        Seeds the random generators used by the augmentation pipeline.
+
+        Args:
+            - seed (int): Seed value
+        '''
+        random.seed(seed)
+        np.random.seed(seed % 2**32)
+
+    def get_augmented_results(self, image, bboxes):
+        '''
+        Apply data augmentation to an input image and bounding boxes.
+
+        Args:
+            - image (numpy.ndarray): Input image.
+            - bboxes (list): List of bounding boxes in YOLO format [x_center, y_center, width, height, class_name].
+        Returns:
+            - tuple: A tuple containing the augmented image and the transformed bounding boxes.
+        '''
+        # Build the pipeline once and reuse it for every image
+        if self.transform is None:
+            self.transform = self.build_transform()
+
         # Apply the augmentations
-        transformed = transform(image=image, bboxes=bboxes)
+        transformed = self.transform(image=image, bboxes=bboxes)
         transformed_image, transformed_bboxes = transformed['image'], transformed['bboxes']
         return transformed_image, transformed_bboxes
 
     def make_copy_folder(self, new_combined_folder):
         '''
-        Copies data folder from combined_folder to new folder specified.
+        Stages raw_dataset from combined_folder into the new folder specified.
+        Files are linked where the filesystem allows and unchanged files are skipped.
 
         Args:
-            - new_combined_folder (str): Path where augmented results will be stored.\
+            - new_combined_folder (str): Path where augmented results will be stored.
+        Returns:
+            - dict: Number of files staged per method, plus skipped files
         '''
-        if not os.path.exists(new_combined_folder):
-            os.makedirs(new_combined_folder+"/images")
-            os.makedirs(new_combined_folder+"/labels")
-
-        img_folder = self.combined_folder+"/raw_dataset/images"
-        txt_folder = self.combined_folder+"/raw_dataset/labels"
-
-        for item in os.listdir(img_folder):
-            source_path = os.path.join(img_folder, item)
-            destination_path = os.path.join(f"{new_combined_folder}/images", item)
-            shutil.copy(source_path,destination_path)
-        for item in os.listdir(txt_folder):
-            source_path = os.path.join(txt_folder, item)
-            destination_path = os.path.join(f"{new_combined_folder}/labels", item)
-            shutil.copy(source_path,destination_path)
+        stage = DatasetStage(logger=self.logger, src_folder=self.combined_folder+"/raw_dataset", dst_folder=new_combined_folder)
+        return stage.stage()
 
     def store_aug(self, aug_img, aug_label, aug_file_name):
         '''
-        Stores augmented data, combined with original data to combined_folder.
+        Stores augmented data to aug_dataset, or appends it to shard_writer if set; call make_copy_folder once beforehand to stage the original data.
 
         Args:
             - aug_img (numpy.ndarray): Augmented Image to store
             - aug_label (list): List of bounding boxes in YOLOv8 format
             - aug_file_name (str): Path to augmented file name
         '''
-        new_path = os.path.join(self.combined_folder, 'aug_dataset')
-        self.make_copy_folder(new_path)
-
+        cls = [self.run_state.label_index(bbox[-1]) for bbox in aug_label]
+        boxes = [bbox[:4] for bbox in aug_label]
+        if self.shard_writer is not None:
+            self.shard_writer.add_image(aug_file_name+".jpg", aug_img, format_labels(cls, boxes))
+            return
         aug_img_pth = os.path.join(self.combined_folder+"/aug_dataset/images" ,aug_file_name+".jpg")
         cv2.imwrite(aug_img_pth, aug_img)
-        with open(self.json_file, 'r') as file:
-            data = json.load(file)
-        aug_lab_pth = os.path.join(self.combined_folder+"/aug_dataset/labels" ,aug_file_name+".txt")
-        with open(aug_lab_pth,'w') as out:
-            for bbox in aug_label:
-                label_name = bbox[-1]
-                label_index = data["candidate_labels"].index(label_name)
-                upd_bbox = f"{label_index} {bbox[0]} {bbox[1]} {bbox[2]} {bbox[3]}"
-                out.write(upd_bbox+"\n")
+        LabelStore.write(self.combined_folder+"/aug_dataset/labels", [(aug_file_name, cls, boxes)])
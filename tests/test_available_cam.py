@@ -0,0 +1,94 @@
+import time
+import logging
+import threading
+
+import cv2
+import pytest
+
+from autotrain_vision import available_cam
+from autotrain_vision.available_cam import AvailableCam
+
+
+class StubBackend:
+    '''
+    cv2.VideoCapture stand-in whose indices take a set time to open; indices in hang block until released
+    '''
+    def __init__(self, delay=0.0, hang=()):
+        self.delay = delay
+        self.hang = set(hang)
+        self.release_hung = threading.Event()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, index):
+        with self._lock:
+            self.calls.append(index)
+        if index in self.hang:
+            self.release_hung.wait()
+        time.sleep(self.delay)
+        return StubCapture(index)
+
+
+class StubCapture:
+    def __init__(self, index):
+        self.index = index
+
+    def isOpened(self):
+        return True
+
+    def get(self, prop):
+        return {cv2.CAP_PROP_FRAME_WIDTH: 640, cv2.CAP_PROP_FRAME_HEIGHT: 480, cv2.CAP_PROP_FPS: 30}[prop]
+
+    def release(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def four_cameras(monkeypatch):
+    # the candidates would otherwise come from /dev/video* on Linux
+    monkeypatch.setattr(available_cam, "candidate_indices", lambda camera_range: list(range(camera_range)))
+    available_cam._CAMERA_CACHE.clear()
+    yield
+    available_cam._CAMERA_CACHE.clear()
+
+
+def make_cam(backend, **kwargs):
+    return AvailableCam(logging.getLogger("AutoTrain"), run_state=None, camera_range=4, capture_backend=backend, **kwargs)
+
+
+def test_probes_run_concurrently():
+    backend = StubBackend(delay=0.3)
+    start = time.monotonic()
+    cameras = make_cam(backend).get_camera_info()
+    elapsed = time.monotonic()-start
+
+    assert [info["index"] for info in cameras] == [0, 1, 2, 3]
+    assert cameras[0] == {"index": 0, "width": 640, "height": 480, "fps": 30.0}
+    # one after the other they would take 4 * 0.3 s
+    assert elapsed < 0.8
+
+
+def test_hanging_index_is_skipped_after_probe_timeout():
+    backend = StubBackend(hang={2})
+    try:
+        start = time.monotonic()
+        cameras = make_cam(backend, probe_timeout=0.3).get_camera_info()
+        elapsed = time.monotonic()-start
+    finally:
+        backend.release_hung.set()
+
+    assert [info["index"] for info in cameras] == [0, 1, 3]
+    assert 0.3 <= elapsed < 1.5
+
+
+def test_second_call_within_cache_ttl_does_not_probe():
+    backend = StubBackend()
+    assert make_cam(backend, cache_ttl=60.0).get_camera_info()
+    assert sorted(backend.calls) == [0, 1, 2, 3]
+
+    # a new instance shares the cache of the same range and backend
+    assert make_cam(backend, cache_ttl=60.0).get_available_cameras() == [0, 1, 2, 3]
+    assert len(backend.calls) == 4
+
+    make_cam(backend, cache_ttl=60.0).get_camera_info(refresh=True)
+    assert len(backend.calls) == 8
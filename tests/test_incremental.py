@@ -0,0 +1,79 @@
+import os
+import logging
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+import yaml
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("ultralytics")
+
+from ultralytics import YOLO
+from ultralytics.nn.tasks import DetectionModel
+
+from autotrain_vision.incremental import HeadRemapper
+from autotrain_vision.new_data import NewData
+from autotrain_vision.run_state import RunState
+
+
+def make_checkpoint(path, names):
+    '''
+    Saves an untrained yolov8n with the given class names as a best.pt, so nothing is downloaded
+    '''
+    model = DetectionModel("yolov8n.yaml", nc=len(names), verbose=False)
+    model.names = dict(enumerate(names))
+    torch.save({"model": model, "train_args": {}}, path)
+    return path
+
+
+def make_split(folder, count, classes, size=64):
+    images_folder = os.path.join(folder, "images")
+    labels_folder = os.path.join(folder, "labels")
+    os.makedirs(images_folder)
+    os.makedirs(labels_folder)
+    rng = np.random.default_rng(0)
+    for i in range(count):
+        image = rng.integers(0, 255, (size, size, 3), dtype=np.uint8)
+        cv2.rectangle(image, (16, 16), (48, 48), (255, 255, 255), -1)
+        cv2.imwrite(os.path.join(images_folder, f"image_{i}.jpg"), image)
+        with open(os.path.join(labels_folder, f"image_{i}.txt"), 'w') as file:
+            file.write(f"{i % classes} 0.5 0.5 0.5 0.5\n")
+
+
+def test_head_remapper_copies_shared_class_rows(tmp_path):
+    prev_model = YOLO(make_checkpoint(str(tmp_path/"best.pt"), ["cup"]))
+    # the known class moves to index 1, so the rows must be matched by name and not by position
+    new_model = DetectionModel("yolov8n.yaml", nc=2, verbose=False)
+    remapper = HeadRemapper(logging.getLogger("AutoTrain"), prev_model, ["mug", "cup"])
+    assert remapper.mapping == [(0, 1)]
+
+    remapper(SimpleNamespace(model=new_model, ema=None))
+
+    for new_branch, prev_branch in zip(new_model.model[-1].cv3, prev_model.model.model[-1].cv3):
+        assert torch.equal(new_branch[-1].weight[1], prev_branch[-1].weight[0])
+        assert torch.equal(new_branch[-1].bias[1], prev_branch[-1].bias[0])
+
+
+def test_warm_start_stops_at_map_threshold(tmp_path, caplog):
+    combined_folder = str(tmp_path/"run")
+    make_split(os.path.join(combined_folder, "train"), 4, classes=2)
+    make_split(os.path.join(combined_folder, "val"), 2, classes=2)
+    with open(os.path.join(combined_folder, "train.yaml"), 'w') as file:
+        yaml.dump({"path": combined_folder, "train": "train/images", "val": "val/images", "names": {0: "cup", 1: "mug"}}, file)
+    run_state = RunState(os.path.join(combined_folder, "inputs.json"))
+    run_state.set_labels(["cup", "mug"])
+    logger = logging.getLogger("AutoTrain")
+    # any mAP50 reaches a threshold of 0, so training stops after the first epoch
+    new_data = NewData(logger, combined_folder, run_state, "mug", image_threshold=4, epochs=3, map_threshold=0.0, inference=False, inference_threshold=0.5)
+
+    with caplog.at_level(logging.INFO, logger="AutoTrain"):
+        new_weights_path, map50 = new_data.train(warm_start=make_checkpoint(str(tmp_path/"best.pt"), ["cup"]), workers=0)
+
+    assert "reused the class head for 1 of 2 classes" in caplog.text
+    assert new_data.train_report["stopped_at_threshold"]
+    assert new_data.train_report["epochs_run"] == 1
+    assert new_data.train_report["epochs_saved"] > 0
+    # the weights are accepted on the same mean mAP50 the run stopped on
+    assert new_weights_path is not None and map50 >= 0.0